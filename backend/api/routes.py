@@ -1,12 +1,17 @@
 """
 API routes for the OneNote RAG application.
 """
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, TypeAdapter
  
 from models import (
+    Document,
     QueryRequest,
     QueryResponse,
     CompareRequest,
@@ -21,13 +26,40 @@ from services import (
     VectorStoreService,
     RAGEngine,
 )
-from services.settings_service import SettingsService
+from services.settings_service import SettingsService, SENSITIVE_KEYS
 from config import get_settings
  
 logger = logging.getLogger(__name__)
  
 router = APIRouter()
  
+# Pages synced concurrently; page indexing is dominated by embedding and
+# vision API latency, so overlapping pages shortens a sync
+DEFAULT_SYNC_CONCURRENCY = 4
+MAX_SYNC_CONCURRENCY = 64
+ 
+# Sync progress is logged at most once per this many pages or seconds
+SYNC_PROGRESS_EVERY_PAGES = 25
+SYNC_PROGRESS_INTERVAL_SECONDS = 2.0
+ 
+# Pages whose chunks are written to the vector store in one call
+SYNC_WRITE_BATCH_PAGES = 20
+ 
+# Page errors reported in a sync response; further errors are only counted
+MAX_SYNC_ERROR_DETAILS = 500
+ 
+# Pages downloaded at once, and fetched pages buffered ahead of indexing
+SYNC_FETCH_WORKERS = 8
+SYNC_QUEUE_SIZE = 32
+ 
+# Incremental syncs list only recently modified pages, but fall back to a
+# full listing at least this often to pick up pages the delta query misses
+FULL_LISTING_INTERVAL_SECONDS = 6 * 3600
+_last_full_listing = float("-inf")
+ 
+# Parses Graph timestamps exactly like DocumentMetadata does
+_DATETIME_ADAPTER = TypeAdapter(datetime)
+ 
 # Global services (will be initialized in main.py)
 onenote_service: Optional[OneNoteService] = None
 document_processor: Optional[DocumentProcessor] = None
@@ -124,7 +156,6 @@ async def get_setting(
         if not setting_info:
             raise HTTPException(status_code=404, detail=f"Setting '{key}' not found")
         
-        from services.settings_service import SENSITIVE_KEYS
         is_sensitive = key in SENSITIVE_KEYS
         has_value = bool(value)
         masked_value = "********" if (is_sensitive and has_value) else (value or "")
@@ -398,6 +429,7 @@ class SyncRequest(BaseModel):
     full_sync: bool = False  # Changed default to False for incremental sync
     force_reindex: bool = False  # Force reindexing even if not modified
     multimodal: bool = True  # Enable multimodal processing (images) if available
+    concurrency: int = Field(DEFAULT_SYNC_CONCURRENCY, ge=1, le=MAX_SYNC_CONCURRENCY)  # Pages synced in parallel
  
  
 class SyncResponse(BaseModel):
@@ -406,8 +438,442 @@ class SyncResponse(BaseModel):
     documents_added: int
     documents_updated: int
     documents_skipped: int
+    documents_failed: int = 0
     chunks_created: int
     message: str
+    error_details: Optional[str] = None
+    duration_seconds: Optional[float] = None
+ 
+ 
+def _iso_utc_key(value: str) -> str:
+    """
+    Normalize a UTC ISO-8601 timestamp for string comparison without parsing it.
+ 
+    Graph returns e.g. "2024-01-01T10:00:00.123Z" while the index stores
+    datetime.isoformat() output such as "2024-01-01T10:00:00.123000+00:00";
+    both map to "2024-01-01T10:00:00.123000".
+ 
+    Args:
+        value: ISO-8601 timestamp string
+ 
+    Returns:
+        Comparable timestamp key
+    """
+    if value.endswith("Z"):
+        value = value[:-1]
+    elif value.endswith("+00:00"):
+        value = value[:-6]
+    head, _, fraction = value.partition(".")
+    return f"{head}.{fraction[:6]:0<6}"
+ 
+ 
+def skip_unchanged_pages(
+    page_entries: List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]],
+    indexed_keys: Dict[str, str]
+) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]], int]:
+    """
+    Drop pages whose modified date matches the index, before their content is downloaded.
+ 
+    Args:
+        page_entries: (notebook, section, page) dictionaries from OneNoteService.list_all_pages
+        indexed_keys: Indexed page_id to modified date, already normalized with _iso_utc_key
+ 
+    Returns:
+        Tuple of (pages that are new or changed, number of pages skipped)
+    """
+    changed = []
+    for entry in page_entries:
+        page = entry[2]
+        existing_key = indexed_keys.get(page["id"])
+        # Only pages already in the index need their timestamps normalized
+        if existing_key:
+            page_modified = page.get("lastModifiedDateTime")
+            if page_modified and existing_key == _iso_utc_key(page_modified):
+                continue
+        changed.append(entry)
+ 
+    skipped = len(page_entries) - len(changed)
+    logger.debug(f"Skipping {skipped} unchanged pages by modified date")
+    return changed, skipped
+ 
+ 
+def list_pages_for_sync(
+    onenote: OneNoteService,
+    store: VectorStoreService,
+    notebook_ids: Optional[List[str]],
+    check_modified: bool
+) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]], int, Dict[str, Dict[str, Any]]]:
+    """
+    List the OneNote pages a sync needs to fetch.
+ 
+    Incremental syncs of all notebooks ask Graph only for pages modified
+    since the newest indexed page, unless a full listing is due (see
+    FULL_LISTING_INTERVAL_SECONDS).
+ 
+    Args:
+        onenote: OneNote service
+        store: Vector store holding the current index
+        notebook_ids: Optional list of notebook IDs to sync
+        check_modified: If True, skip pages that are unchanged in the index
+ 
+    Returns:
+        Tuple of (page entries to fetch, number of unchanged pages skipped,
+        indexed page_id to its modified_date, etag and content_sha256)
+    """
+    global _last_full_listing
+ 
+    indexed = store.get_page_metadata(("modified_date", "etag", "content_sha256")) if check_modified else {}
+    # Normalize each indexed date once, for both the delta query and the filter
+    indexed_keys = {
+        page_id: _iso_utc_key(metadata["modified_date"])
+        for page_id, metadata in indexed.items()
+        if metadata["modified_date"]
+    }
+ 
+    page_entries = None
+    if (
+        indexed_keys
+        and notebook_ids is None
+        and time.monotonic() - _last_full_listing < FULL_LISTING_INTERVAL_SECONDS
+    ):
+        page_entries = onenote.list_pages_modified_since(f"{max(indexed_keys.values())}Z")
+ 
+    if page_entries is None:
+        listing_started = time.monotonic()
+        page_entries = onenote.list_all_pages(notebook_ids)
+        if notebook_ids is None:
+            _last_full_listing = listing_started
+        listed_pages = len(page_entries)
+    else:
+        # Indexed pages outside the delta are unchanged as well
+        listed_pages = len(indexed) + sum(
+            1 for _, _, page in page_entries if page["id"] not in indexed
+        )
+ 
+    if check_modified and page_entries:
+        page_entries, _ = skip_unchanged_pages(page_entries, indexed_keys)
+    skipped = listed_pages - len(page_entries) if check_modified else 0
+ 
+    return page_entries, skipped, indexed
+ 
+ 
+def fetch_document_for_sync(
+    onenote: OneNoteService,
+    store: VectorStoreService,
+    page_entry: Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]],
+    indexed: Dict[str, Dict[str, Any]]
+) -> Tuple[str, Optional[Document]]:
+    """
+    Fetch one listed page, unless its content is unchanged in the index.
+ 
+    Pages with a newer timestamp but the same content ETag are not
+    downloaded, and downloaded pages whose HTML hashes the same as the
+    indexed copy are not returned; for both, only the indexed date is
+    updated so the next sync skips them by timestamp.
+ 
+    Args:
+        onenote: OneNote service
+        store: Vector store holding the current index
+        page_entry: (notebook, section, page) dictionaries from a page listing
+        indexed: Indexed page metadata from list_pages_for_sync
+ 
+    Returns:
+        Tuple of (outcome, document to index) where outcome is "fetched",
+        "skipped" or "failed" and the document is only set when fetched
+    """
+    notebook, section, page = page_entry
+    page_id = page["id"]
+    existing = indexed.get(page_id, {})
+ 
+    doc, not_modified = onenote.get_document(notebook, section, page, existing.get("etag"))
+ 
+    if not_modified:
+        modified = page.get("lastModifiedDateTime")
+        if modified:
+            store.update_page_metadata(
+                page_id, {"modified_date": _DATETIME_ADAPTER.validate_python(modified).isoformat()}
+            )
+        logger.debug(f"Skipping page with unmodified content: {page.get('title')}")
+        return "skipped", None
+ 
+    if doc is None:
+        return "failed", None
+ 
+    # Re-saved pages whose HTML is byte-identical need no re-indexing either
+    if existing.get("content_sha256") and existing["content_sha256"] == doc.metadata.content_sha256:
+        updates = {"modified_date": doc.metadata.modified_date.isoformat()} if doc.metadata.modified_date else {}
+        if doc.metadata.etag:
+            updates["etag"] = doc.metadata.etag
+        if updates:
+            store.update_page_metadata(page_id, updates)
+        logger.debug(f"Skipping page with identical content: {doc.metadata.page_title}")
+        return "skipped", None
+ 
+    return "fetched", doc
+ 
+ 
+async def sync_document(
+    doc: Document,
+    check_modified: bool,
+    use_multimodal: bool,
+    processor: DocumentProcessor,
+    store: VectorStoreService,
+    indexed_modified: Optional[Dict[str, str]] = None
+) -> Tuple[str, List[Any], Optional[Dict[str, Any]]]:
+    """
+    Chunk one OneNote page for indexing, planning the replacement of its previous version.
+ 
+    The chunks are returned rather than written so callers can batch writes.
+    For a changed page, chunks whose text is already stored are left out of
+    the result, so only new text gets embedded; the returned reuse plan
+    deletes and updates the stored chunks and must only be applied once the
+    new chunks have been added.
+ 
+    Args:
+        doc: Document fetched from OneNote
+        check_modified: If True, skip pages whose modified date matches the index
+        use_multimodal: If True, analyze and store images with the multimodal processor
+        processor: Text-only document processor
+        store: Vector store holding the current index
+        indexed_modified: Optional page_id to modified date of the whole index,
+            prefetched once per sync; looked up in the store per page if omitted
+ 
+    Returns:
+        Tuple of (outcome, chunks to add, reuse plan or None) where outcome is
+        "added", "updated" or "skipped"
+    """
+    page_id = doc.metadata.page_id
+    modified_date = doc.metadata.modified_date
+    outcome = "added"
+ 
+    # Check if document needs updating (incremental sync)
+    if check_modified:
+        if indexed_modified is not None:
+            existing_modified = indexed_modified.get(page_id)
+        else:
+            existing_modified = store.get_page_modified_date(page_id)
+ 
+        if existing_modified and modified_date:
+            # The stored date is already in ISO format from .isoformat()
+            new_dt_str = modified_date.isoformat()
+ 
+            if existing_modified == new_dt_str:
+                logger.debug(f"Skipping unchanged page: {doc.metadata.page_title} (modified: {existing_modified})")
+                return "skipped", [], None
+ 
+            logger.debug(f"Page modified: {doc.metadata.page_title}")
+            logger.debug(f"  Existing: {existing_modified}")
+            logger.debug(f"  New:      {new_dt_str}")
+ 
+        # Document is new or modified - its old chunks are replaced once chunked
+        if existing_modified:
+            logger.debug(f"Updating modified page: {doc.metadata.page_title}")
+            outcome = "updated"
+        else:
+            logger.debug(f"Adding new page: {doc.metadata.page_title}")
+ 
+    # Process and chunk the document (multimodal or text-only)
+    if use_multimodal:
+        # Multimodal processing: text + metadata + images
+        chunks, image_data_list = await multimodal_processor.chunk_document_multimodal(
+            document=doc,
+            enrich_with_metadata=True,
+            include_images=True
+        )
+ 
+        # Store images in image storage
+        if image_data_list and image_storage:
+            for img_data in image_data_list:
+                try:
+                    image_path = image_storage.generate_image_path(
+                        page_id=img_data["page_id"],
+                        image_index=img_data["position"]
+                    )
+                    await image_storage.upload(
+                        image_path=image_path,
+                        image_data=img_data["data"],
+                        content_type="image/png",
+                        metadata={
+                            "page_id": img_data["page_id"],
+                            "position": img_data["position"],
+                            "url": img_data.get("url", "")
+                        }
+                    )
+                    logger.debug(f"Stored image {img_data['position']} for page {page_id}")
+                except Exception as e:
+                    logger.error(f"Error storing image: {str(e)}")
+ 
+            logger.info(f"Stored {len(image_data_list)} images for document {page_id}")
+    else:
+        # Text-only processing (original behavior), parsed off the event loop
+        chunks = await processor.chunk_document_async(doc)
+ 
+    plan = None
+    if outcome == "updated":
+        plan, chunks = await asyncio.to_thread(store.reuse_unchanged_chunks, page_id, chunks)
+ 
+    return outcome, chunks, plan
+ 
+ 
+async def sync_pages_concurrently(
+    page_entries: List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]],
+    indexed: Dict[str, Dict[str, Any]],
+    check_modified: bool,
+    use_multimodal: bool,
+    onenote: OneNoteService,
+    processor: DocumentProcessor,
+    store: VectorStoreService,
+    concurrency: int = DEFAULT_SYNC_CONCURRENCY,
+    on_document_done: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """
+    Fetch and index pages as a pipeline with at most `concurrency` pages indexing at once.
+ 
+    SYNC_FETCH_WORKERS workers download pages into a bounded queue while
+    `concurrency` workers chunk them, so downloading, parsing and embedding
+    overlap instead of every page being fetched before any is indexed. A
+    failing page is logged and counted without aborting the others.
+    Chunks are written to the vector store every SYNC_WRITE_BATCH_PAGES
+    pages, so embedding and storage happen in a few large calls instead of
+    one per page; an updated page's old chunks are only replaced once its
+    new chunks are written, so it stays searchable until then. Progress is logged every SYNC_PROGRESS_EVERY_PAGES pages
+    or SYNC_PROGRESS_INTERVAL_SECONDS seconds, whichever comes first.
+ 
+    Args:
+        page_entries: (notebook, section, page) dictionaries from list_pages_for_sync
+        indexed: Indexed page metadata from list_pages_for_sync
+        check_modified: If True, skip pages whose modified date matches the index
+        use_multimodal: If True, analyze and store images with the multimodal processor
+        onenote: OneNote service to fetch page content from
+        processor: Text-only document processor
+        store: Vector store to write chunks to
+        concurrency: Maximum number of pages indexed at once
+        on_document_done: Optional callback receiving each page's outcome
+ 
+    Returns:
+        Counts keyed by "added", "updated", "skipped", "failed" and "chunks",
+        plus "error_details": up to MAX_SYNC_ERROR_DETAILS page errors joined
+        with "; " (empty if none)
+    """
+    indexed_modified = {page_id: metadata["modified_date"] for page_id, metadata in indexed.items()}
+    counts = {"added": 0, "updated": 0, "skipped": 0, "failed": 0, "chunks": 0}
+    total = len(page_entries)
+    done = 0
+    last_progress_log = time.monotonic()
+    # Pages waiting to be fetched, and fetched documents waiting to be indexed
+    fetch_queue: asyncio.Queue = asyncio.Queue()
+    for page_entry in page_entries:
+        fetch_queue.put_nowait(page_entry)
+    document_queue: asyncio.Queue = asyncio.Queue(maxsize=SYNC_QUEUE_SIZE)
+    # Chunked pages waiting for the next batched write, as (outcome, chunks, reuse plan)
+    pending: List[Tuple[str, List[Any], Optional[Dict[str, Any]]]] = []
+    error_details: List[str] = []
+    errors_dropped = 0
+ 
+    def record_error(detail: str) -> None:
+        nonlocal errors_dropped
+        logger.error(detail)
+        if len(error_details) < MAX_SYNC_ERROR_DETAILS:
+            error_details.append(detail)
+        else:
+            errors_dropped += 1
+ 
+    def record(outcome: str) -> None:
+        counts[outcome] += 1
+        if on_document_done:
+            on_document_done(outcome)
+ 
+    def report_progress() -> None:
+        nonlocal done, last_progress_log
+        done += 1
+        now = time.monotonic()
+        if done % SYNC_PROGRESS_EVERY_PAGES == 0 or now - last_progress_log >= SYNC_PROGRESS_INTERVAL_SECONDS:
+            last_progress_log = now
+            logger.info(f"Sync progress: {done}/{total} pages")
+ 
+    async def flush() -> None:
+        # Swap the buffer out before awaiting so other pages keep filling a new one
+        batch = pending[:]
+        pending.clear()
+        if not batch:
+            return
+        chunks = [chunk for _, page_chunks, _ in batch for chunk in page_chunks]
+        try:
+            # Embedding calls run off the event loop so pages keep processing
+            await asyncio.to_thread(store.add_documents, chunks)
+        except Exception as e:
+            record_error(f"Error writing {len(batch)} pages to the vector store: {str(e)}")
+            counts["failed"] += len(batch)
+            return
+        counts["chunks"] += len(chunks)
+        # Updated pages drop their stale chunks only now that the new ones are stored
+        for outcome, _, plan in batch:
+            if plan is not None:
+                try:
+                    await asyncio.to_thread(store.apply_chunk_reuse, plan)
+                except Exception as e:
+                    record_error(f"Error replacing old chunks of page {plan['page_id']}: {str(e)}")
+                    counts["failed"] += 1
+                    continue
+            record(outcome)
+ 
+    async def fetch_worker() -> None:
+        while not fetch_queue.empty():
+            page_entry = fetch_queue.get_nowait()
+            try:
+                # Graph calls block on the rate limiter, so they run in threads
+                outcome, doc = await asyncio.to_thread(
+                    fetch_document_for_sync, onenote, store, page_entry, indexed
+                )
+            except Exception as e:
+                record_error(f"Error fetching page {page_entry[2].get('title')}: {str(e)}")
+                outcome, doc = "failed", None
+            else:
+                if outcome == "failed":
+                    record_error(f"Could not fetch content of page {page_entry[2].get('title')}")
+            if doc is None:
+                record(outcome)
+                report_progress()
+                continue
+            await document_queue.put(doc)
+ 
+    async def index_worker() -> None:
+        while True:
+            doc = await document_queue.get()
+            if doc is None:
+                return
+            try:
+                outcome, chunks, plan = await sync_document(
+                    doc, check_modified, use_multimodal, processor, store, indexed_modified
+                )
+            except Exception as e:
+                record_error(f"Error syncing page {doc.metadata.page_title}: {str(e)}")
+                counts["failed"] += 1
+                continue
+            finally:
+                report_progress()
+ 
+            if outcome == "skipped":
+                record(outcome)
+                continue
+            pending.append((outcome, chunks, plan))
+            if len(pending) >= SYNC_WRITE_BATCH_PAGES:
+                await flush()
+ 
+    index_workers = [asyncio.create_task(index_worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*(fetch_worker() for _ in range(min(SYNC_FETCH_WORKERS, total))))
+    finally:
+        # One sentinel per index worker once every page has been fetched
+        for _ in index_workers:
+            await document_queue.put(None)
+        await asyncio.gather(*index_workers)
+    await flush()
+ 
+    counts["error_details"] = "; ".join(error_details)
+    if errors_dropped:
+        counts["error_details"] += f"; (+{errors_dropped} more)"
+    return counts
  
  
 @router.post("/index/sync", response_model=SyncResponse)
@@ -432,6 +898,7 @@ async def sync_documents(
     - Images are analyzed with GPT-4o Vision and stored separately
     - All components linked by page_id for document integrity
     """
+    sync_started = time.monotonic()
     try:
         # Check if multimodal processing is requested and available
         use_multimodal = request.multimodal and multimodal_processor is not None
@@ -443,11 +910,15 @@ async def sync_documents(
             logger.info("Using MULTIMODAL processing (text + images)")
         else:
             logger.info("Using TEXT-ONLY processing")
-        # Get documents from OneNote
+        check_modified = not request.full_sync and not request.force_reindex
+ 
+        # List pages in OneNote
         logger.info(f"Fetching documents from OneNote (notebooks: {request.notebook_ids})")
-        documents = onenote.get_all_documents(request.notebook_ids)
+        page_entries, unchanged_skipped, indexed = list_pages_for_sync(
+            onenote, store, request.notebook_ids, check_modified
+        )
  
-        if not documents:
+        if not page_entries and not unchanged_skipped:
             return SyncResponse(
                 status="success",
                 documents_processed=0,
@@ -463,108 +934,43 @@ async def sync_documents(
             logger.info("Performing full sync - clearing existing data")
             store.clear_collection()
  
-        # Process documents based on sync mode
-        documents_added = 0
-        documents_updated = 0
-        documents_skipped = 0
-        total_chunks = 0
- 
-        for doc in documents:
-            page_id = doc.metadata.page_id
-            modified_date = doc.metadata.modified_date
-           
-            # Check if document needs updating (incremental sync)
-            if not request.full_sync and not request.force_reindex:
-                existing_modified = store.get_page_modified_date(page_id)
-               
-                if existing_modified and modified_date:
-                    # CRITICAL FIX: Convert both to ISO format for proper comparison
-                    # The stored date is already in ISO format from .isoformat()
-                    existing_dt_str = existing_modified  # Already a string in ISO format
-                    
-                    # Convert the datetime object to ISO format for comparison
-                    new_dt_str = modified_date.isoformat()
-                    
-                    # Compare the ISO formatted strings
-                    if existing_dt_str == new_dt_str:
-                        logger.debug(f"Skipping unchanged page: {doc.metadata.page_title} (modified: {existing_dt_str})")
-                        documents_skipped += 1
-                        continue
-                    else:
-                        logger.info(f"Page modified: {doc.metadata.page_title}")
-                        logger.debug(f"  Existing: {existing_dt_str}")
-                        logger.debug(f"  New:      {new_dt_str}")
-               
-                # Document is new or modified - delete old version and add new
-                if existing_modified:
-                    logger.info(f"Updating modified page: {doc.metadata.page_title}")
-                    store.delete_by_page_id(page_id)
-                    documents_updated += 1
-                else:
-                    logger.info(f"Adding new page: {doc.metadata.page_title}")
-                    documents_added += 1
-            else:
-                # Full sync or force reindex - just count as added
-                documents_added += 1
- 
-            # Process and chunk the document (multimodal or text-only)
-            if use_multimodal:
-                # Multimodal processing: text + metadata + images
-                chunks, image_data_list = await multimodal_processor.chunk_document_multimodal(
-                    document=doc,
-                    enrich_with_metadata=True,
-                    include_images=True
-                )
-
-                # Store images in image storage
-                if image_data_list and image_storage:
-                    for img_data in image_data_list:
-                        try:
-                            image_path = image_storage.generate_image_path(
-                                page_id=img_data["page_id"],
-                                image_index=img_data["position"]
-                            )
-                            await image_storage.upload(
-                                image_path=image_path,
-                                image_data=img_data["data"],
-                                content_type="image/png",
-                                metadata={
-                                    "page_id": img_data["page_id"],
-                                    "position": img_data["position"],
-                                    "url": img_data.get("url", "")
-                                }
-                            )
-                            logger.debug(f"Stored image {img_data['position']} for page {page_id}")
-                        except Exception as e:
-                            logger.error(f"Error storing image: {str(e)}")
-
-                    logger.info(f"Stored {len(image_data_list)} images for document {page_id}")
-            else:
-                # Text-only processing (original behavior)
-                chunks = processor.chunk_documents([doc])
-
-            # Add chunks to vector store
-            store.add_documents(chunks)
-            total_chunks += len(chunks)
+        # Fetch and process pages based on sync mode; full sync and force
+        # reindex count every page as added
+        counts = await sync_pages_concurrently(
+            page_entries,
+            indexed,
+            check_modified=check_modified,
+            use_multimodal=use_multimodal,
+            onenote=onenote,
+            processor=processor,
+            store=store,
+            concurrency=request.concurrency
+        )
+        counts["skipped"] += unchanged_skipped
  
         message_parts = []
-        if documents_added > 0:
-            message_parts.append(f"{documents_added} added")
-        if documents_updated > 0:
-            message_parts.append(f"{documents_updated} updated")
-        if documents_skipped > 0:
-            message_parts.append(f"{documents_skipped} skipped")
+        if counts["added"] > 0:
+            message_parts.append(f"{counts['added']} added")
+        if counts["updated"] > 0:
+            message_parts.append(f"{counts['updated']} updated")
+        if counts["skipped"] > 0:
+            message_parts.append(f"{counts['skipped']} skipped")
+        if counts["failed"] > 0:
+            message_parts.append(f"{counts['failed']} failed")
        
-        message = f"Successfully synced: {', '.join(message_parts)} ({total_chunks} chunks)"
+        message = f"Successfully synced: {', '.join(message_parts)} ({counts['chunks']} chunks)"
  
         return SyncResponse(
             status="success",
-            documents_processed=len(documents),
-            documents_added=documents_added,
-            documents_updated=documents_updated,
-            documents_skipped=documents_skipped,
-            chunks_created=total_chunks,
-            message=message
+            documents_processed=len(page_entries) + unchanged_skipped,
+            documents_added=counts["added"],
+            documents_updated=counts["updated"],
+            documents_skipped=counts["skipped"],
+            documents_failed=counts["failed"],
+            chunks_created=counts["chunks"],
+            message=message,
+            error_details=counts["error_details"] or None,
+            duration_seconds=round(time.monotonic() - sync_started, 3)
         )
  
     except Exception as e:
@@ -615,14 +1021,17 @@ class IndexedPage(BaseModel):
     url: Optional[str]
  
  
-@router.get("/index/pages")
+@router.get("/index/pages", response_class=ORJSONResponse)
 async def get_indexed_pages(
+    limit: Optional[int] = Query(None, ge=1, description="Return only the most recently modified pages"),
     store: VectorStoreService = Depends(get_vector_store)
 ):
     """Get list of all indexed pages with their metadata."""
     try:
-        pages_data = store.get_indexed_pages()
-        return {"pages": pages_data}
+        pages_data = store.get_indexed_pages(limit=limit)
+        # Plain JSON values straight from Chroma: serialize with orjson and
+        # skip FastAPI's per-value jsonable_encoder walk
+        return ORJSONResponse({"pages": pages_data})
     except Exception as e:
         logger.error(f"Error getting indexed pages: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3,6 +3,7 @@ Main FastAPI application.
 """
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,9 +16,11 @@ from services import (
     RAGEngine,
 )
 from services.vision_service import GPT4VisionService
+from services.vision_cache import VisionCache
 from services.image_storage import ImageStorageService
 from services.multimodal_query import MultimodalQueryHandler
 from services.database import DatabaseService
+from services.document_processor import shutdown_parse_pool
 from services.encryption import EncryptionService
 from services.settings_service import SettingsService
 import api.routes as routes
@@ -96,6 +99,7 @@ async def lifespan(app: FastAPI):
         os.environ['OPENAI_API_KEY'] = dynamic_settings["openai_api_key"]
     if dynamic_settings.get("langchain_api_key"):
         os.environ['LANGCHAIN_API_KEY'] = dynamic_settings["langchain_api_key"]
+    routes.settings_service.refresh_env()
     
     logger.info("Configuration loaded from database (with .env fallback)")
  
@@ -143,7 +147,8 @@ async def lifespan(app: FastAPI):
                 api_key=openai_key,
                 default_model="gpt-4o-mini",  # Use mini for cost efficiency during indexing
                 max_tokens=1000,
-                temperature=0.0
+                temperature=0.0,
+                cache=VisionCache(db_path="./data/vision_cache.db")
             )
             logger.info("Vision service initialized")
 
@@ -215,6 +220,7 @@ async def lifespan(app: FastAPI):
         # Create background task function
         async def background_sync():
             """Background task to sync OneNote documents without blocking startup."""
+            sync_started = time.monotonic()
             try:
                 # Set sync status
                 routes.sync_status = {
@@ -226,87 +232,36 @@ async def lifespan(app: FastAPI):
                 
                 logger.info("Starting background incremental sync...")
                 
-                # Fetch all documents from OneNote
-                documents = routes.onenote_service.get_all_documents()
-                logger.info(f"Retrieved {len(documents)} documents from OneNote")
+                # List new and changed pages in OneNote
+                page_entries, unchanged_skipped, indexed = routes.list_pages_for_sync(
+                    routes.onenote_service, routes.vector_store, None, check_modified=True
+                )
+                logger.info(f"Found {len(page_entries)} pages to sync in OneNote ({unchanged_skipped} unchanged)")
                
-                if documents:
-                    documents_added = 0
-                    documents_updated = 0
-                    documents_skipped = 0
-                    total_chunks = 0
+                if page_entries or unchanged_skipped:
+                    def record_progress(outcome: str) -> None:
+                        # Update progress
+                        if outcome != "skipped":
+                            routes.sync_status["documents_processed"] += 1
                     
                     # Perform incremental sync - only process changed/new documents
-                    for doc in documents:
-                        page_id = doc.metadata.page_id
-                        modified_date = doc.metadata.modified_date
-                        
-                        # Check if document exists and compare modification dates
-                        existing_modified = routes.vector_store.get_page_modified_date(page_id)
-                        
-                        if existing_modified and modified_date:
-                            # Convert to ISO format for comparison
-                            existing_dt_str = existing_modified
-                            new_dt_str = modified_date.isoformat()
-                            
-                            if existing_dt_str == new_dt_str:
-                                # Document unchanged, skip it
-                                logger.debug(f"Skipping unchanged page: {doc.metadata.page_title}")
-                                documents_skipped += 1
-                                continue
-                            else:
-                                # Document modified, update it
-                                logger.info(f"Updating modified page: {doc.metadata.page_title}")
-                                routes.vector_store.delete_by_page_id(page_id)
-                                documents_updated += 1
-                        else:
-                            # New document
-                            logger.info(f"Adding new page: {doc.metadata.page_title}")
-                            documents_added += 1
-                        
-                        # Process and add the document (with multimodal support if available)
-                        use_multimodal = multimodal_processor is not None
-
-                        if use_multimodal:
-                            # Multimodal processing: text + metadata + images
-                            chunks, image_data_list = await multimodal_processor.chunk_document_multimodal(
-                                document=doc,
-                                enrich_with_metadata=True,
-                                include_images=True
-                            )
-
-                            # Store images in image storage
-                            if image_data_list and image_storage:
-                                for img_data in image_data_list:
-                                    try:
-                                        img_path = image_storage.generate_image_path(
-                                            page_id=img_data["page_id"],
-                                            image_index=img_data["position"]
-                                        )
-                                        await image_storage.upload(
-                                            image_path=img_path,
-                                            image_data=img_data["data"],
-                                            content_type="image/png",
-                                            metadata={
-                                                "page_id": img_data["page_id"],
-                                                "position": img_data["position"]
-                                            }
-                                        )
-                                    except Exception as e:
-                                        logger.error(f"Error storing image during startup sync: {str(e)}")
-
-                                logger.debug(f"Stored {len(image_data_list)} images for {page_id}")
-                        else:
-                            # Text-only processing
-                            chunks = routes.document_processor.chunk_documents([doc])
-
-                        routes.vector_store.add_documents(chunks)
-                        total_chunks += len(chunks)
-                        
-                        # Update progress
-                        routes.sync_status["documents_processed"] = documents_added + documents_updated
+                    counts = await routes.sync_pages_concurrently(
+                        page_entries,
+                        indexed,
+                        check_modified=True,
+                        use_multimodal=multimodal_processor is not None,
+                        onenote=routes.onenote_service,
+                        processor=routes.document_processor,
+                        store=routes.vector_store,
+                        on_document_done=record_progress
+                    )
+                    documents_added = counts["added"]
+                    documents_updated = counts["updated"]
+                    documents_skipped = counts["skipped"] + unchanged_skipped
+                    total_chunks = counts["chunks"]
+                    duration_seconds = round(time.monotonic() - sync_started, 3)
                     
-                    logger.info(f"✅ Background sync complete: {documents_added} added, {documents_updated} updated, {documents_skipped} skipped ({total_chunks} chunks)")
+                    logger.info(f"✅ Background sync complete in {duration_seconds:.1f}s: {documents_added} added, {documents_updated} updated, {documents_skipped} skipped ({total_chunks} chunks)")
                     routes.sync_status = {
                         "in_progress": False,
                         "status": "complete",
@@ -314,7 +269,10 @@ async def lifespan(app: FastAPI):
                         "documents_added": documents_added,
                         "documents_updated": documents_updated,
                         "documents_skipped": documents_skipped,
-                        "total_chunks": total_chunks
+                        "documents_failed": counts["failed"],
+                        "error_details": counts["error_details"],
+                        "total_chunks": total_chunks,
+                        "duration_seconds": duration_seconds
                     }
                 else:
                     logger.info("No documents found in OneNote")
@@ -357,6 +315,13 @@ async def lifespan(app: FastAPI):
  
     # Shutdown
     logger.info("Shutting down application...")
+    if routes.onenote_service:
+        routes.onenote_service.close()
+    if routes.rag_engine:
+        await routes.rag_engine.aclose()
+    if routes.vision_service:
+        await routes.vision_service.aclose()
+    shutdown_parse_pool()
  
  
 # Create FastAPI app
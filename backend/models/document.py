@@ -16,6 +16,8 @@ class DocumentMetadata(BaseModel):
     author: Optional[str] = Field(None, description="Page author")
     tags: List[str] = Field(default_factory=list, description="Page tags")
     url: Optional[str] = Field(None, description="OneNote web URL")
+    etag: Optional[str] = Field(None, description="ETag of the page content, for conditional fetches")
+    content_sha256: Optional[str] = Field(None, description="SHA-256 of the page HTML, to detect identical re-saves")
 
 
 class Document(BaseModel):
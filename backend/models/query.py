@@ -1,5 +1,5 @@
 """Query and response models."""
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 
@@ -42,7 +42,7 @@ class ResponseMetadata(BaseModel):
     latency_ms: int = Field(..., ge=0, description="Response latency in milliseconds")
     tokens_used: Optional[int] = Field(None, description="Total tokens used")
     cost_usd: Optional[float] = Field(None, description="Estimated cost in USD")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Response timestamp")
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="Response timestamp")
     model_name: str = Field(..., description="LLM model used")
     retrieval_k: int = Field(..., description="Number of documents retrieved")
 
@@ -23,6 +23,7 @@ class RAGFusionConfig(BaseModel):
     enabled: bool = Field(default=False, description="Enable RAG-Fusion")
     num_queries: int = Field(default=4, ge=2, le=10, description="Number of related queries to generate")
     rrf_k: int = Field(default=60, ge=1, le=100, description="RRF constant for scoring")
+    top_k: Optional[int] = Field(default=None, ge=1, le=50, description="Number of fused documents to keep (all if unset)")
 
 
 class DecompositionConfig(BaseModel):
@@ -30,6 +31,8 @@ class DecompositionConfig(BaseModel):
     enabled: bool = Field(default=False, description="Enable query decomposition")
     mode: Literal["recursive", "individual"] = Field(default="recursive", description="Decomposition mode")
     max_sub_questions: int = Field(default=3, ge=2, le=5, description="Maximum number of sub-questions")
+    qa_window: int = Field(default=3, ge=1, le=5, description="Number of most recent Q&A pairs passed to each sub-question answer")
+    context_char_budget: int = Field(default=6000, ge=500, le=50000, description="Maximum characters of document context per sub-question answer")
 
 
 class StepBackConfig(BaseModel):
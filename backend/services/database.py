@@ -4,7 +4,7 @@ SQLite database service for settings management.
 import sqlite3
 import logging
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 from contextlib import contextmanager
 
@@ -40,6 +40,8 @@ class DatabaseService:
         """
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
+        # Safe with WAL: a crash can lose the last commit but not corrupt the file
+        conn.execute("PRAGMA synchronous=NORMAL")
         try:
             yield conn
             conn.commit()
@@ -55,6 +57,10 @@ class DatabaseService:
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
+            # Write-ahead logging lets readers proceed during writes and
+            # makes each commit a single append; the mode persists in the file
+            cursor.execute("PRAGMA journal_mode=WAL")
+
             # Create settings table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS settings (
@@ -133,25 +139,46 @@ class DatabaseService:
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Check if setting exists
-            existing = self.get_setting(key)
-
-            if existing:
-                # Update existing setting
-                cursor.execute("""
-                    UPDATE settings 
-                    SET value = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE key = ?
-                """, (value, key))
-            else:
-                # Insert new setting
-                cursor.execute("""
-                    INSERT INTO settings (key, value, is_sensitive, description)
-                    VALUES (?, ?, ?, ?)
-                """, (key, value, int(is_sensitive), description))
-
-            # Return the updated setting
-            return self.get_setting(key)
+            # Insert, or update only the value of an existing setting
+            cursor.execute("""
+                INSERT INTO settings (key, value, is_sensitive, description)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE
+                SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+            """, (key, value, int(is_sensitive), description))
+
+            # Return the updated setting, read within the same transaction
+            cursor.execute("SELECT * FROM settings WHERE key = ?", (key,))
+            return dict(cursor.fetchone())
+
+    def set_settings_bulk(
+        self,
+        settings: List[Tuple[str, str, bool, Optional[str]]]
+    ) -> int:
+        """
+        Create or update several settings in a single transaction.
+
+        Args:
+            settings: List of (key, value, is_sensitive, description) tuples
+
+        Returns:
+            Number of settings written
+        """
+        if not settings:
+            return 0
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO settings (key, value, is_sensitive, description)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE
+                SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+            """, [
+                (key, value, int(is_sensitive), description)
+                for key, value, is_sensitive, description in settings
+            ])
+            return len(settings)
 
     def delete_setting(self, key: str) -> bool:
         """
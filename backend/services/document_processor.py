@@ -1,17 +1,61 @@
 """
 Document processor for text extraction and chunking.
 """
+import asyncio
 import logging
+import os
 import re
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from bs4 import BeautifulSoup
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangChainDocument
 
 from models.document import Document
 
+try:
+    import lxml.etree
+    import lxml.html
+    _LXML_AVAILABLE = True
+except ImportError:
+    _LXML_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Opening of an image tag; pages without one need no parse for images
+_IMG_TAG_RE = re.compile(r"<img", re.IGNORECASE)
+
+# Worker processes that parse page HTML off the event loop, shared by all
+# processors and created on first use
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+# Per-worker-process processor used by _parse_page_worker
+_worker_processor: Optional["DocumentProcessor"] = None
+
+
+def _parse_page_worker(html_content: str, include_images: bool) -> Tuple[str, List[Dict[str, str]]]:
+    """Parse one page in a pool worker; module-level so it can be pickled."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor.parse_page(html_content, include_images)
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Get the shared HTML parsing pool, creating it on first use."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    """Stop the HTML parsing worker processes, if they were started."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
 
 class DocumentProcessor:
     """Service for processing and chunking documents."""
@@ -33,37 +77,175 @@ class DocumentProcessor:
             separators=["\n\n", "\n", ". ", " ", ""],
         )
 
-    def extract_text_from_html(self, html_content: str) -> str:
+    def parse_html(self, html_content: str) -> Optional["lxml.html.HtmlElement"]:
         """
-        Extract plain text from OneNote HTML content.
+        Parse HTML with lxml's C parser.
 
         Args:
             html_content: HTML content from OneNote
 
         Returns:
-            Cleaned plain text
+            Root element, or None if lxml is unavailable or cannot parse the
+            content (callers then fall back to BeautifulSoup)
         """
+        if not _LXML_AVAILABLE or not html_content:
+            return None
         try:
-            soup = BeautifulSoup(html_content, "html.parser")
-
+            if html_content.lstrip().startswith("<?xml"):
+                # lxml rejects str input carrying an encoding declaration, so
+                # hand it the UTF-8 bytes and override the declared encoding
+                parser = lxml.html.HTMLParser(encoding="utf-8")
+                return lxml.html.fromstring(html_content.encode("utf-8"), parser=parser)
+            return lxml.html.fromstring(html_content)
+        except (lxml.etree.ParserError, ValueError) as e:
+            logger.debug(f"lxml could not parse HTML, falling back to BeautifulSoup: {str(e)}")
+            return None
+
+    def _parse_tree(self, html_content: str):
+        """Parse HTML with lxml, or with BeautifulSoup if lxml cannot."""
+        root = self.parse_html(html_content)
+        if root is not None:
+            return root
+        return BeautifulSoup(html_content, "html.parser")
+
+    def _text_from_tree(self, tree) -> str:
+        """Extract whitespace-cleaned text from a parsed page (removes its scripts and styles)."""
+        if isinstance(tree, BeautifulSoup):
             # Remove script and style elements
-            for script in soup(["script", "style"]):
+            for script in tree(["script", "style"]):
                 script.decompose()
 
             # Get text
-            text = soup.get_text(separator="\n")
+            text = tree.get_text(separator="\n")
+        else:
+            # Remove script and style elements, keeping the text after them
+            lxml.etree.strip_elements(tree, "script", "style", with_tail=False)
+            text = "\n".join(tree.itertext())
+
+        # Clean up whitespace: one phrase per line, splitting lines and
+        # double-spaced phrases in a single pass of C string methods
+        phrases = "  ".join(text.splitlines()).split("  ")
+        return "\n".join(filter(None, map(str.strip, phrases)))
+
+    def _images_from_tree(self, tree) -> List[Dict[str, str]]:
+        """Extract image info from a parsed page."""
+        if isinstance(tree, BeautifulSoup):
+            img_tags = tree.find_all('img')
+        else:
+            img_tags = tree.iter('img')
+        images = []
+
+        for img in img_tags:
+            src = img.get('src', '')
+            alt = img.get('alt', '')
+            data_fullres = img.get('data-fullres-src', '')  # OneNote may have full-res versions
+
+            # Use full-res if available, otherwise use src
+            image_url = data_fullres if data_fullres else src
+
+            if image_url:
+                images.append({
+                    "url": image_url,
+                    "alt_text": alt,
+                    "position": len(images)  # Track position in document
+                })
+
+        return images
+
+    def extract_text_from_html(self, html_content: str) -> str:
+        """
+        Extract plain text from OneNote HTML content.
 
-            # Clean up whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = "\n".join(chunk for chunk in chunks if chunk)
+        Args:
+            html_content: HTML content from OneNote
 
-            return text
+        Returns:
+            Cleaned plain text
+        """
+        try:
+            return self._text_from_tree(self._parse_tree(html_content))
 
         except Exception as e:
             logger.error(f"Error extracting text from HTML: {str(e)}")
             return ""
 
+    def extract_images_from_html(self, html_content: str) -> List[Dict[str, str]]:
+        """
+        Extract every image URL and its alt text from OneNote HTML content.
+
+        Args:
+            html_content: HTML content from OneNote
+
+        Returns:
+            List of dictionaries with image info (url, alt_text, position)
+        """
+        if not html_content or not _IMG_TAG_RE.search(html_content):
+            return []
+
+        try:
+            return self._images_from_tree(self._parse_tree(html_content))
+
+        except Exception as e:
+            logger.error(f"Error extracting image URLs: {str(e)}")
+            return []
+
+    def parse_page(self, html_content: str, include_images: bool = False) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Extract cleaned text and, optionally, image info from a page.
+
+        The HTML is parsed once for both; images are read before text
+        extraction strips scripts and styles from the tree.
+
+        Args:
+            html_content: HTML content from OneNote
+            include_images: If True, also extract image URLs
+
+        Returns:
+            Tuple of (cleaned text, image info list)
+        """
+        if not include_images or not html_content or not _IMG_TAG_RE.search(html_content):
+            return self.clean_text(self.extract_text_from_html(html_content)), []
+
+        try:
+            tree = self._parse_tree(html_content)
+        except Exception as e:
+            logger.error(f"Error parsing page HTML: {str(e)}")
+            return "", []
+
+        try:
+            images = self._images_from_tree(tree)
+        except Exception as e:
+            logger.error(f"Error extracting image URLs: {str(e)}")
+            images = []
+
+        try:
+            text = self._text_from_tree(tree)
+        except Exception as e:
+            logger.error(f"Error extracting text from HTML: {str(e)}")
+            text = ""
+
+        return self.clean_text(text), images
+
+    async def parse_page_async(
+        self,
+        html_content: str,
+        include_images: bool = False
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Run parse_page in a worker process so parsing does not block the event loop.
+
+        Args:
+            html_content: HTML content from OneNote
+            include_images: If True, also extract image URLs
+
+        Returns:
+            Tuple of (cleaned text, image info list)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_parse_pool(), _parse_page_worker, html_content, include_images
+        )
+
     def clean_text(self, text: str) -> str:
         """
         Clean and normalize text.
@@ -156,6 +338,43 @@ class DocumentProcessor:
         # Clean text
         text = self.clean_text(text)
 
+        return self.chunk_text(document, text, enrich_with_metadata)
+
+    async def chunk_document_async(
+        self,
+        document: Document,
+        enrich_with_metadata: bool = True
+    ) -> List[LangChainDocument]:
+        """
+        Process and chunk a document, parsing its HTML in a worker process.
+
+        Args:
+            document: Document to process
+            enrich_with_metadata: If True, prepend metadata context to text for semantic search
+
+        Returns:
+            List of LangChain Document chunks
+        """
+        text, _ = await self.parse_page_async(document.content)
+        return self.chunk_text(document, text, enrich_with_metadata)
+
+    def chunk_text(
+        self,
+        document: Document,
+        text: str,
+        enrich_with_metadata: bool = True
+    ) -> List[LangChainDocument]:
+        """
+        Chunk a document's already extracted and cleaned text.
+
+        Args:
+            document: Document the text was extracted from
+            text: Cleaned plain text of the document
+            enrich_with_metadata: If True, prepend metadata context to text for semantic search
+
+        Returns:
+            List of LangChain Document chunks
+        """
         if not text:
             logger.warning(f"No text extracted from document {document.id}")
             return []
@@ -185,6 +404,10 @@ class DocumentProcessor:
             metadata["created_date"] = document.metadata.created_date.isoformat()
         if document.metadata.modified_date:
             metadata["modified_date"] = document.metadata.modified_date.isoformat()
+        if document.metadata.etag:
+            metadata["etag"] = document.metadata.etag
+        if document.metadata.content_sha256:
+            metadata["content_sha256"] = document.metadata.content_sha256
 
         # Split into chunks (now includes metadata context if enabled)
         chunks = self.text_splitter.create_documents(
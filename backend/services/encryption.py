@@ -6,6 +6,7 @@ import base64
 import logging
 from cryptography.fernet import Fernet
 from pathlib import Path
+from typing import List
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +74,22 @@ class EncryptionService:
         encrypted_bytes = self.cipher.encrypt(plaintext.encode())
         return base64.b64encode(encrypted_bytes).decode()
 
+    def encrypt_batch(self, plaintexts: List[str]) -> List[str]:
+        """
+        Encrypt several strings with the same cipher instance.
+
+        Args:
+            plaintexts: Strings to encrypt
+
+        Returns:
+            Base64-encoded encrypted strings, in input order
+        """
+        cipher_encrypt = self.cipher.encrypt
+        return [
+            base64.b64encode(cipher_encrypt(plaintext.encode())).decode() if plaintext else ""
+            for plaintext in plaintexts
+        ]
+
     def decrypt(self, encrypted: str) -> str:
         """
         Decrypt a string.
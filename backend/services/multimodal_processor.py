@@ -3,20 +3,70 @@ Multimodal document processor for handling text, metadata, and images together.
 
 This maintains DOCUMENT INTEGRITY - everything is linked by page_id.
 """
+import asyncio
 import logging
+import math
+import random
 import re
 import base64
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import List, Dict, Optional, Tuple
-from bs4 import BeautifulSoup
 from langchain_core.documents import Document as LangChainDocument
 import httpx
 
 from models.document import Document
 from .document_processor import DocumentProcessor
-from .vision_service import GPT4VisionService
+from .vision_service import GPT4VisionService, VISION_BATCH_SIZE
+
+# Optional SIMD base64 decoder for inline images (pip install pybase64)
+try:
+    import pybase64
+    _PYBASE64_AVAILABLE = True
+except ImportError:
+    _PYBASE64_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Images downloaded and analyzed at once, across all pages being synced
+DEFAULT_IMAGE_CONCURRENCY = 4
+
+# Longest Retry-After honored for a throttled image download
+MAX_IMAGE_RETRY_AFTER_SECONDS = 30.0
+
+# Fraction of the wait added at random, so downloads throttled together
+# do not all retry at the same instant
+IMAGE_RETRY_JITTER = 0.1
+
+# Header of an inline base64 image; the payload follows the match
+_DATA_URL_RE = re.compile(r'data:image/[^,]*;base64,', re.ASCII)
+
+
+def _compute_retry_wait(response: httpx.Response) -> float:
+    """
+    Work out how long to wait before retrying a throttled image download.
+
+    Args:
+        response: The 429 response
+
+    Returns:
+        Seconds from Retry-After (delay or HTTP date; 1s if absent or
+        unparseable), capped at MAX_IMAGE_RETRY_AFTER_SECONDS, plus jitter
+    """
+    retry_after = response.headers.get("Retry-After", "").strip()
+    try:
+        wait_time = float(retry_after)
+        if math.isnan(wait_time):
+            wait_time = 1.0
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+            wait_time = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            wait_time = 1.0
+    wait_time = min(max(wait_time, 0.0), MAX_IMAGE_RETRY_AFTER_SECONDS)
+    return wait_time + random.uniform(0, wait_time * IMAGE_RETRY_JITTER)
+
 
 class MultimodalDocumentProcessor(DocumentProcessor):
     """
@@ -36,7 +86,8 @@ class MultimodalDocumentProcessor(DocumentProcessor):
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
         max_images_per_document: int = 10,
-        access_token: Optional[str] = None
+        access_token: Optional[str] = None,
+        max_concurrent_images: int = DEFAULT_IMAGE_CONCURRENCY
     ):
         """
         Initialize multimodal document processor.
@@ -47,15 +98,24 @@ class MultimodalDocumentProcessor(DocumentProcessor):
             chunk_overlap: Overlap between chunks
             max_images_per_document: Maximum images to process per document
             access_token: Optional access token for downloading OneNote images
+            max_concurrent_images: Maximum images downloaded and analyzed in parallel
         """
         super().__init__(chunk_size, chunk_overlap)
         self.vision_service = vision_service
         self.max_images_per_document = max_images_per_document
         self.access_token = access_token
+        self._image_semaphore = asyncio.Semaphore(max_concurrent_images)
 
-        # HTTP client for downloading images
+        # HTTP client for downloading images, reusing keep-alive connections;
+        # HTTP/2 multiplexes concurrent downloads over one connection per host.
+        # The pool is sized to the image semaphore, the real cap on downloads
         self.http_client = httpx.AsyncClient(
+            http2=True,
             timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=max_concurrent_images,
+                max_keepalive_connections=max_concurrent_images
+            ),
             verify=False,
             headers={"Authorization": f"Bearer {access_token}"} if access_token else {}
         )
@@ -75,31 +135,9 @@ class MultimodalDocumentProcessor(DocumentProcessor):
         Returns:
             List of dictionaries with image info (url, alt_text, etc.)
         """
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-            images = []
-
-            for img in soup.find_all('img'):
-                src = img.get('src', '')
-                alt = img.get('alt', '')
-                data_fullres = img.get('data-fullres-src', '')  # OneNote may have full-res versions
-
-                # Use full-res if available, otherwise use src
-                image_url = data_fullres if data_fullres else src
-
-                if image_url:
-                    images.append({
-                        "url": image_url,
-                        "alt_text": alt,
-                        "position": len(images)  # Track position in document
-                    })
-
-            logger.debug(f"Extracted {len(images)} image URLs from HTML")
-            return images[:self.max_images_per_document]  # Limit number of images
-
-        except Exception as e:
-            logger.error(f"Error extracting image URLs: {str(e)}")
-            return []
+        images = self.extract_images_from_html(html_content)
+        logger.debug(f"Extracted {len(images)} image URLs from HTML")
+        return images[:self.max_images_per_document]  # Limit number of images
 
     async def download_image(self, image_url: str) -> Optional[bytes]:
         """
@@ -115,24 +153,68 @@ class MultimodalDocumentProcessor(DocumentProcessor):
             # Handle data URLs (base64 encoded images)
             if image_url.startswith('data:image'):
                 # Extract base64 data
-                match = re.search(r'base64,(.+)', image_url)
+                match = _DATA_URL_RE.match(image_url)
                 if match:
-                    base64_data = match.group(1)
+                    base64_data = image_url[match.end():]
+                    if _PYBASE64_AVAILABLE:
+                        return pybase64.b64decode(base64_data, validate=False)
                     return base64.b64decode(base64_data)
 
-            # Download from URL
-            response = await self.http_client.get(image_url)
-            response.raise_for_status()
-            return response.content
+            # Download from URL, waiting out one throttled response
+            async with self.http_client.stream("GET", image_url) as response:
+                if response.status_code != 429:
+                    response.raise_for_status()
+                    return await self._read_image_body(response)
+                wait_time = _compute_retry_wait(response)
+
+            logger.warning(f"Image download throttled (429), retrying in {wait_time:.1f}s")
+            await asyncio.sleep(wait_time)
+            async with self.http_client.stream("GET", image_url) as response:
+                response.raise_for_status()
+                return await self._read_image_body(response)
 
         except Exception as e:
             logger.error(f"Error downloading image from {image_url}: {str(e)}")
             return None
 
+    async def _read_image_body(self, response: httpx.Response) -> bytes:
+        """
+        Read a streamed image body into one buffer.
+
+        When the size is announced the buffer is allocated once and filled in
+        place, so the image is never held both as chunks and joined bytes.
+
+        Args:
+            response: Response opened with http_client.stream()
+
+        Returns:
+            Image data (a bytearray, usable wherever bytes are)
+        """
+        content_length = response.headers.get("Content-Length", "")
+        if not content_length.isdigit() or "Content-Encoding" in response.headers:
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer += chunk
+            return buffer
+
+        buffer = bytearray(int(content_length))
+        offset = 0
+        async for chunk in response.aiter_bytes():
+            # Same-length slice assignment fills in place; a server sending
+            # more than announced just grows the buffer
+            end = offset + len(chunk)
+            buffer[offset:end] = chunk
+            offset = end
+
+        # Less data than announced
+        del buffer[offset:]
+        return buffer
+
     async def extract_and_analyze_images(
         self,
         html_content: str,
-        document_context: Optional[str] = None
+        document_context: Optional[str] = None,
+        image_infos: Optional[List[Dict[str, str]]] = None
     ) -> List[Dict[str, any]]:
         """
         Extract images from HTML and analyze them with GPT-4o Vision.
@@ -140,12 +222,16 @@ class MultimodalDocumentProcessor(DocumentProcessor):
         Args:
             html_content: HTML content from OneNote
             document_context: Optional context about the document
+            image_infos: Image info already extracted from html_content, if any
 
         Returns:
             List of image analysis results
         """
         # Extract image URLs
-        image_infos = self.extract_image_urls_from_html(html_content)
+        if image_infos is None:
+            image_infos = self.extract_image_urls_from_html(html_content)
+        else:
+            image_infos = image_infos[:self.max_images_per_document]
 
         if not image_infos:
             logger.debug("No images found in document")
@@ -153,39 +239,59 @@ class MultimodalDocumentProcessor(DocumentProcessor):
 
         logger.info(f"Processing {len(image_infos)} images")
 
-        # Download and analyze each image
-        analyzed_images = []
-        for i, img_info in enumerate(image_infos):
-            try:
-                # Download image
-                image_data = await self.download_image(img_info["url"])
-                if not image_data:
-                    logger.warning(f"Failed to download image {i+1}")
-                    continue
-
-                # Analyze with GPT-4o Vision
-                context_str = f"{document_context} - Image {i+1}" if document_context else None
-                image_context = await self.vision_service.create_image_context_for_indexing(
-                    image_data=image_data,
-                    image_index=i,
-                    document_context=context_str
+        async def fetch_image(i: int, img_info: Dict[str, str]) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+            async with self._image_semaphore:
+                try:
+                    image_data = await self.download_image(img_info["url"])
+                except Exception as e:
+                    logger.error(f"Error processing image {i+1}: {str(e)}")
+                    return None
+            if not image_data:
+                logger.warning(f"Failed to download image {i+1}")
+                return None
+            return i, img_info, image_data
+
+        async def analyze_batch(batch: List[Tuple[int, Dict[str, str], bytes]]) -> List[Dict[str, any]]:
+            async with self._image_semaphore:
+                # Analyze with GPT-4o Vision, several images per request
+                image_contexts = await self.vision_service.create_image_contexts_for_indexing(
+                    images=[image_data for _, _, image_data in batch],
+                    image_indices=[i for i, _, _ in batch],
+                    document_contexts=[
+                        f"{document_context} - Image {i+1}" if document_context else None
+                        for i, _, _ in batch
+                    ]
                 )
-
-                analyzed_images.append({
+            return [
+                {
                     "position": i,
                     "url": img_info["url"],
                     "alt_text": img_info.get("alt_text", ""),
                     "context": image_context,
                     "data": image_data  # Keep for storage
-                })
-
-                logger.debug(f"Analyzed image {i+1}/{len(image_infos)}")
+                }
+                for (i, img_info, image_data), image_context in zip(batch, image_contexts)
+            ]
+
+        # Download images concurrently, keeping document order
+        downloaded = [
+            result for result in await asyncio.gather(
+                *(fetch_image(i, img_info) for i, img_info in enumerate(image_infos))
+            )
+            if result is not None
+        ]
 
-            except Exception as e:
-                logger.error(f"Error processing image {i+1}: {str(e)}")
-                continue
+        # Analyze them in batches sharing vision requests
+        batches = [downloaded[start:start + VISION_BATCH_SIZE] for start in range(0, len(downloaded), VISION_BATCH_SIZE)]
+        analyzed_images = [
+            image for batch_images in await asyncio.gather(*(analyze_batch(batch) for batch in batches))
+            for image in batch_images
+        ]
 
-        logger.info(f"Successfully analyzed {len(analyzed_images)} images")
+        logger.info(
+            f"Successfully analyzed {len(analyzed_images)} images "
+            f"({self.vision_service.vision_calls_saved} vision calls saved by the cache so far)"
+        )
         return analyzed_images
 
     async def chunk_document_multimodal(
@@ -214,9 +320,8 @@ class MultimodalDocumentProcessor(DocumentProcessor):
             - chunks: LangChain Document chunks ready for embedding
             - image_data_list: List of image data dicts for storage
         """
-        # Extract text
-        text = self.extract_text_from_html(document.content)
-        text = self.clean_text(text)
+        # Extract text and image URLs in a worker process
+        text, image_infos = await self.parse_page_async(document.content, include_images=include_images)
 
         if not text:
             logger.warning(f"No text extracted from document {document.id}")
@@ -241,7 +346,8 @@ class MultimodalDocumentProcessor(DocumentProcessor):
                 doc_context = f"{document.metadata.page_title} from {document.metadata.notebook_name}"
                 analyzed_images = await self.extract_and_analyze_images(
                     document.content,
-                    document_context=doc_context
+                    document_context=doc_context,
+                    image_infos=image_infos
                 )
 
                 if analyzed_images:
@@ -286,6 +392,10 @@ class MultimodalDocumentProcessor(DocumentProcessor):
             metadata["created_date"] = document.metadata.created_date.isoformat()
         if document.metadata.modified_date:
             metadata["modified_date"] = document.metadata.modified_date.isoformat()
+        if document.metadata.etag:
+            metadata["etag"] = document.metadata.etag
+        if document.metadata.content_sha256:
+            metadata["content_sha256"] = document.metadata.content_sha256
 
         # Chunk the enriched content
         chunks = self.text_splitter.create_documents(
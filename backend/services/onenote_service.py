@@ -15,14 +15,20 @@ Rate Limiting Strategy for Large Sections (e.g., 125+ pages):
 This allows safe sync of sections with 125+ pages without hitting
 Microsoft Graph API rate limits (typically 600 requests/minute).
 """
+import codecs
+import hashlib
 import logging
 import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Mapping, Optional, Tuple
+from urllib.parse import quote, urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 from msal import ConfidentialClientApplication
  
 from models.document import Document, DocumentMetadata
-from services.rate_limiter import AdaptiveRateLimiter, BatchProcessor
+from services.rate_limiter import BatchProcessor, create_rate_limiter
  
 logger = logging.getLogger(__name__)
  
@@ -36,6 +42,13 @@ class OneNoteService:
     MIN_REQUEST_INTERVAL = 0.5  # Minimum 500ms between requests (120 req/min max)
     RATE_LIMIT_RETRY_DELAY = 60  # Wait 60s on 429 error
     MAX_RATE_LIMIT_RETRIES = 3  # Max retries for 429 errors
+    BATCH_MAX_REQUESTS = 20  # Graph JSON batching limit per $batch call
+    CONTENT_STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read at a time from page content responses
+    HTTP_POOL_SIZE = 32  # Keep-alive connections kept per host
+   
+    # Quota headers reported by Graph workloads, in order of preference
+    RATE_LIMIT_REMAINING_HEADERS = ("RateLimit-Remaining", "X-RateLimit-Remaining", "x-ms-ratelimit-remaining")
+    RATE_LIMIT_LIMIT_HEADERS = ("RateLimit-Limit", "X-RateLimit-Limit", "x-ms-ratelimit-limit")
  
     def __init__(self, client_id: str = "", client_secret: str = "", tenant_id: str = "", manual_token: str = "", use_azure_ad: bool = True):
         """
@@ -55,19 +68,27 @@ class OneNoteService:
         self.use_azure_ad = use_azure_ad
         self.access_token: Optional[str] = None
        
-        # Initialize adaptive rate limiter (100 req/min, well below 600 limit)
-        self.rate_limiter = AdaptiveRateLimiter(
+        # Initialize adaptive rate limiter (100 req/min, well below 600 limit),
+        # shared across workers through Redis when REDIS_URL is set
+        self.rate_limiter = create_rate_limiter(
             requests_per_minute=100,
             burst_size=10,
             min_interval_ms=500  # Minimum 500ms between requests
         )
-        self.batch_processor = BatchProcessor(self.rate_limiter)
+        self.batch_processor = BatchProcessor(
+            rate_limiter=self.rate_limiter,
+            max_concurrency=self.rate_limiter.burst_size
+        )
        
         # Legacy rate limiting (kept for backwards compatibility, but unused)
         self.last_request_time = 0
        
-        # Create a session for connection pooling and reuse
+        # Create a session for connection pooling and reuse. Pages and $batch
+        # calls are fetched from several threads at once, so keep more
+        # connections to Graph alive than requests' default of 10.
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.HTTP_POOL_SIZE)
+        self.session.mount("https://", adapter)
         self.session.headers.update({"Content-Type": "application/json"})
  
         # Authenticate based on use_azure_ad setting
@@ -110,13 +131,71 @@ class OneNoteService:
         except Exception as e:
             logger.error(f"Error during authentication: {str(e)}")
    
-    def _make_request_with_retry(self, url: str, max_retries: int = 3) -> Optional[Dict[str, Any]]:
+    def _observe_rate_limit_headers(self, headers: Mapping[str, str]) -> None:
+        """
+        Feed the quota reported in response headers to the rate limiter.
+       
+        Lets the limiter slow down while the quota is running out, rather than
+        only after Graph starts answering 429.
+       
+        Args:
+            headers: Case-insensitive headers of a Graph response or $batch subresponse
+        """
+        remaining = self._int_header(headers, self.RATE_LIMIT_REMAINING_HEADERS)
+        if remaining is not None:
+            limit = self._int_header(headers, self.RATE_LIMIT_LIMIT_HEADERS)
+            self.rate_limiter.record_quota(remaining, limit)
+   
+    @staticmethod
+    def _int_header(headers: Mapping[str, str], names: Tuple[str, ...]) -> Optional[int]:
+        """Get the first of the named headers that holds an integer."""
+        for name in names:
+            value = headers.get(name)
+            if value is not None:
+                try:
+                    return int(value)
+                except ValueError:
+                    continue
+        return None
+   
+    def _read_text_streamed(self, response: requests.Response) -> str:
+        """
+        Read a streamed response body as text.
+       
+        Each chunk is decoded as it arrives, so the raw body is never held
+        alongside its decoded copy (pages with embedded images can be large).
+       
+        Args:
+            response: Response opened with stream=True
+           
+        Returns:
+            Decoded response body
+        """
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        parts = [
+            decoder.decode(chunk)
+            for chunk in response.iter_content(chunk_size=self.CONTENT_STREAM_CHUNK_SIZE)
+        ]
+        parts.append(decoder.decode(b"", final=True))
+        return "".join(parts)
+   
+    def _make_request_with_retry(
+        self,
+        url: str,
+        max_retries: int = 3,
+        method: str = "GET",
+        json_body: Optional[Dict[str, Any]] = None,
+        request_count: int = 1
+    ) -> Optional[Dict[str, Any]]:
         """
         Make HTTP request with adaptive rate limiting and retry logic.
        
         Args:
             url: API endpoint URL
             max_retries: Maximum number of retries for server errors
+            method: HTTP method
+            json_body: Optional JSON request body
+            request_count: Rate limit tokens to take (subrequests in a $batch call)
            
         Returns:
             Response JSON data or None on failure
@@ -126,9 +205,12 @@ class OneNoteService:
         for attempt in range(max_retries):
             try:
                 # Acquire rate limit token (will wait if necessary)
-                self.rate_limiter.acquire(wait=True)
+                if not self.rate_limiter.acquire_many(request_count, wait=True):
+                    logger.warning("Rate limiter closed; aborting request")
+                    return None
                
-                response = self.session.get(url, timeout=30)
+                response = self.session.request(method, url, json=json_body, timeout=30)
+                self._observe_rate_limit_headers(response.headers)
                
                 # Handle rate limiting (429)
                 if response.status_code == 429:
@@ -140,7 +222,8 @@ class OneNoteService:
                         wait_time = None
                    
                     # Tell rate limiter about the error (it will adapt)
-                    self.rate_limiter.handle_rate_limit_error(retry_after=wait_time)
+                    if not self.rate_limiter.handle_rate_limit_error(retry_after=wait_time):
+                        return None
                     self.rate_limiter.record_error(is_rate_limit=True)
                    
                     logger.warning(
@@ -174,6 +257,71 @@ class OneNoteService:
        
         return None
  
+    def batch_get(self, paths: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        GET several Graph resources using JSON batching.
+       
+        Paths are sent BATCH_MAX_REQUESTS at a time through /$batch, with the
+        batches themselves issued concurrently. Subrequests that fail inside a
+        batch (e.g. throttled with 429) are retried individually.
+       
+        Args:
+            paths: Resource paths relative to the API version (e.g. /me/onenote/notebooks)
+           
+        Returns:
+            Response bodies in the order of paths, None where a request failed
+        """
+        chunks = [
+            paths[start:start + self.BATCH_MAX_REQUESTS]
+            for start in range(0, len(paths), self.BATCH_MAX_REQUESTS)
+        ]
+       
+        def run_batch(chunk: List[str]) -> List[Optional[Dict[str, Any]]]:
+            data = self._make_request_with_retry(
+                f"{self.GRAPH_API_ENDPOINT}/$batch",
+                method="POST",
+                json_body={
+                    "requests": [
+                        {"id": str(i), "method": "GET", "url": path}
+                        for i, path in enumerate(chunk)
+                    ]
+                },
+                request_count=len(chunk)
+            )
+           
+            bodies: List[Optional[Dict[str, Any]]] = [None] * len(chunk)
+            if data:
+                for response in data.get("responses", []):
+                    self._observe_rate_limit_headers(CaseInsensitiveDict(response.get("headers") or {}))
+                    if response.get("status") == 200:
+                        bodies[int(response["id"])] = response.get("body")
+           
+            # Retry anything the batch did not return
+            for i, body in enumerate(bodies):
+                if body is None:
+                    bodies[i] = self._make_request_with_retry(f"{self.GRAPH_API_ENDPOINT}{chunk[i]}")
+            return bodies
+       
+        with ThreadPoolExecutor(max_workers=self.rate_limiter.burst_size) as executor:
+            return [body for bodies in executor.map(run_batch, chunks) for body in bodies]
+ 
+    def _collect_paged_values(self, data: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Collect the values of a paged Graph response, following @odata.nextLink.
+ 
+        Args:
+            data: First page of the response (None if it failed)
+ 
+        Returns:
+            Values from all pages that could be fetched
+        """
+        values = []
+        while data:
+            values.extend(data.get("value", []))
+            next_link = data.get("@odata.nextLink")
+            data = self._make_request_with_retry(next_link) if next_link else None
+        return values
+ 
     def _get_headers(self) -> Dict[str, str]:
         """Get HTTP headers for API requests."""
         return {
@@ -267,6 +415,52 @@ class OneNoteService:
         logger.info(f"Found {len(all_pages)} total pages in section {section_id} across {page_batch} batches")
         return all_pages
  
+    def list_pages_modified_since(
+        self, since: str, notebook_ids: Optional[List[str]] = None
+    ) -> Optional[List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]]:
+        """
+        List pages modified at or after a time, filtered server-side.
+ 
+        Uses a single paged query over all pages, so an incremental sync costs
+        requests proportional to the changes rather than to the notebook size.
+ 
+        Args:
+            since: UTC ISO-8601 timestamp (e.g. 2024-01-01T10:00:00Z)
+            notebook_ids: Optional list of notebook IDs to keep
+ 
+        Returns:
+            List of (notebook, section, page) dictionaries like list_all_pages,
+            or None if the query failed and the caller should list everything
+        """
+        if not self.access_token:
+            return []
+ 
+        params = {
+            "$filter": f"lastModifiedDateTime ge {since}",
+            "$select": "id,title,createdDateTime,lastModifiedDateTime,links",
+            "$expand": "parentSection($select=id,displayName),parentNotebook($select=id,displayName)",
+            "$top": "100",
+        }
+        url = f"{self.GRAPH_API_ENDPOINT}/me/onenote/pages?{urlencode(params, quote_via=quote, safe='$,()=;')}"
+        entries = []
+       
+        while url:
+            data = self._make_request_with_retry(url)
+            if not data:
+                logger.warning(f"Failed to list pages modified since {since}")
+                return None
+           
+            for page in data.get("value", []):
+                notebook = page.get("parentNotebook") or {}
+                if notebook_ids and notebook.get("id") not in notebook_ids:
+                    continue
+                entries.append((notebook, page.get("parentSection") or {}, page))
+           
+            url = data.get("@odata.nextLink")
+       
+        logger.info(f"Found {len(entries)} pages modified since {since}")
+        return entries
+ 
     def get_page_content(self, page_id: str) -> Optional[str]:
         """
         Get the HTML content of a OneNote page with adaptive rate limiting.
@@ -278,8 +472,26 @@ class OneNoteService:
         Returns:
             HTML content as string, or None if error
         """
+        return self.fetch_page_content(page_id)[0]
+ 
+    def fetch_page_content(
+        self, page_id: str, etag: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        Get the HTML content of a OneNote page, conditionally on its ETag.
+ 
+        Args:
+            page_id: Page ID
+            etag: ETag from a previous fetch; if the content still matches it,
+                Graph answers 304 and no body is transferred
+ 
+        Returns:
+            Tuple of (HTML content or None, ETag of the content, True if not modified)
+        """
         if not self.access_token:
-            return None
+            return None, None, False
+       
+        headers = {"If-None-Match": etag} if etag else None
        
         max_retries = 3
         retry_delay = 2
@@ -287,36 +499,45 @@ class OneNoteService:
         for attempt in range(max_retries):
             try:
                 # Acquire rate limit token (adaptive)
-                self.rate_limiter.acquire(wait=True)
+                if not self.rate_limiter.acquire(wait=True):
+                    logger.warning("Rate limiter closed; aborting page content fetch")
+                    return None, None, False
                
                 url = f"{self.GRAPH_API_ENDPOINT}/me/onenote/pages/{page_id}/content"
-                response = self.session.get(url, timeout=30)
-               
-                # Handle rate limiting (429)
-                if response.status_code == 429:
-                    retry_after = response.headers.get('Retry-After')
-                    try:
-                        wait_time = int(retry_after) if retry_after else None
-                    except ValueError:
-                        wait_time = None
+                with self.session.get(url, headers=headers, timeout=30, stream=True) as response:
+                    self._observe_rate_limit_headers(response.headers)
                    
-                    self.rate_limiter.handle_rate_limit_error(retry_after=wait_time)
-                    self.rate_limiter.record_error(is_rate_limit=True)
+                    if response.status_code == 304:
+                        self.rate_limiter.record_success()
+                        logger.debug(f"Content of page {page_id} not modified")
+                        return None, etag, True
                    
-                    logger.warning(
-                        f"Rate limit hit fetching page {page_id}. "
-                        f"Adapting rate to {self.rate_limiter.requests_per_minute:.1f} req/min..."
-                    )
-                    continue
-               
-                response.raise_for_status()
-                content = response.text
-               
-                # Record success
-                self.rate_limiter.record_success()
-               
-                logger.debug(f"Retrieved content for page {page_id} ({len(content)} chars)")
-                return content
+                    # Handle rate limiting (429)
+                    if response.status_code == 429:
+                        retry_after = response.headers.get('Retry-After')
+                        try:
+                            wait_time = int(retry_after) if retry_after else None
+                        except ValueError:
+                            wait_time = None
+                       
+                        if not self.rate_limiter.handle_rate_limit_error(retry_after=wait_time):
+                            return None, None, False
+                        self.rate_limiter.record_error(is_rate_limit=True)
+                       
+                        logger.warning(
+                            f"Rate limit hit fetching page {page_id}. "
+                            f"Adapting rate to {self.rate_limiter.requests_per_minute:.1f} req/min..."
+                        )
+                        continue
+                   
+                    response.raise_for_status()
+                    content = self._read_text_streamed(response)
+                   
+                    # Record success
+                    self.rate_limiter.record_success()
+                   
+                    logger.debug(f"Retrieved content for page {page_id} ({len(content)} chars)")
+                    return content, response.headers.get("ETag"), False
  
             except requests.RequestException as e:
                 if attempt < max_retries - 1:
@@ -332,72 +553,149 @@ class OneNoteService:
                
                 logger.error(f"Error fetching page content: {str(e)}")
                 self.rate_limiter.record_error(is_rate_limit=False)
-                return None
+                return None, None, False
        
-        return None
+        return None, None, False
  
-    def get_all_documents(self, notebook_ids: Optional[List[str]] = None) -> List[Document]:
+    def list_all_pages(
+        self, notebook_ids: Optional[List[str]] = None
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]:
         """
-        Get all documents from specified notebooks (or all notebooks).
+        List page metadata from specified notebooks (or all notebooks) without content.
  
         Args:
             notebook_ids: Optional list of notebook IDs to process
  
         Returns:
-            List of Document objects
+            List of (notebook, section, page) dictionaries, in notebook and section order
         """
-        documents = []
- 
         # Get notebooks
         notebooks = self.list_notebooks()
         if notebook_ids:
             notebooks = [nb for nb in notebooks if nb["id"] in notebook_ids]
  
-        for notebook in notebooks:
-            notebook_name = notebook["displayName"]
-            notebook_id = notebook["id"]
+        # Fan out the metadata listing through $batch: sections of all notebooks
+        # at once, then pages of all sections at once
+        section_responses = self.batch_get([
+            f"/me/onenote/notebooks/{notebook['id']}/sections" for notebook in notebooks
+        ])
+        notebook_sections = [
+            (notebook, section)
+            for notebook, data in zip(notebooks, section_responses)
+            for section in (data or {}).get("value", [])
+        ]
+        page_responses = self.batch_get([
+            f"/me/onenote/sections/{section['id']}/pages" for _, section in notebook_sections
+        ])
+       
+        # Sections with more pages than one response holds continue via nextLink
+        with ThreadPoolExecutor(max_workers=self.rate_limiter.burst_size) as executor:
+            page_lists = list(executor.map(self._collect_paged_values, page_responses))
+        logger.info(
+            f"Found {sum(map(len, page_lists))} pages in {len(notebook_sections)} sections "
+            f"of {len(notebooks)} notebooks"
+        )
  
-            # Get sections
-            sections = self.list_sections(notebook_id)
+        return [
+            (notebook, section, page)
+            for (notebook, section), pages in zip(notebook_sections, page_lists)
+            for page in pages
+        ]
+ 
+    def get_document(
+        self,
+        notebook: Dict[str, Any],
+        section: Dict[str, Any],
+        page: Dict[str, Any],
+        etag: Optional[str] = None
+    ) -> Tuple[Optional[Document], bool]:
+        """
+        Fetch content for one listed page and build its document.
  
-            for section in sections:
-                section_name = section["displayName"]
-                section_id = section["id"]
+        Args:
+            notebook: Notebook dictionary the page belongs to
+            section: Section dictionary the page belongs to
+            page: Page dictionary from a page listing
+            etag: Optional ETag of the indexed content; if the content still
+                matches it is not downloaded
  
-                # Get pages
-                pages = self.list_pages(section_id)
+        Returns:
+            Tuple of (Document, or None if not modified or not fetched, True if not modified)
+        """
+        page_id = page["id"]
+        page_title = page["title"]
+        page_url = page.get("links", {}).get("oneNoteWebUrl", {}).get("href", "")
+ 
+        # Get page content
+        content, content_etag, is_not_modified = self.fetch_page_content(page_id, etag)
+        if is_not_modified:
+            return None, True
+        if not content:
+            return None, False
+ 
+        # Create document
+        metadata = DocumentMetadata(
+            page_id=page_id,
+            page_title=page_title,
+            section_name=section.get("displayName", ""),
+            notebook_name=notebook.get("displayName", ""),
+            created_date=page.get("createdDateTime"),
+            modified_date=page.get("lastModifiedDateTime"),
+            url=page_url,
+            etag=content_etag,
+            content_sha256=hashlib.sha256(content.encode("utf-8")).hexdigest(),
+        )
  
-                for page in pages:
-                    page_id = page["id"]
-                    page_title = page["title"]
-                    page_url = page.get("links", {}).get("oneNoteWebUrl", {}).get("href", "")
+        doc = Document(
+            id=page_id,
+            content=content,
+            metadata=metadata,
+        )
  
-                    # Get page content
-                    content = self.get_page_content(page_id)
-                    if not content:
-                        continue
+        return doc, False
  
-                    # Create document
-                    metadata = DocumentMetadata(
-                        page_id=page_id,
-                        page_title=page_title,
-                        section_name=section_name,
-                        notebook_name=notebook_name,
-                        created_date=page.get("createdDateTime"),
-                        modified_date=page.get("lastModifiedDateTime"),
-                        url=page_url,
-                    )
+    def get_documents(
+        self,
+        page_entries: List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]],
+        etags: Optional[Dict[str, str]] = None
+    ) -> Tuple[List[Document], List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]]:
+        """
+        Fetch content for listed pages and build documents.
  
-                    doc = Document(
-                        id=page_id,
-                        content=content,
-                        metadata=metadata,
-                    )
+        Args:
+            page_entries: (notebook, section, page) dictionaries from list_all_pages
+            etags: Optional page_id to ETag of the indexed content; pages whose
+                content still matches are not downloaded
  
-                    documents.append(doc)
+        Returns:
+            Tuple of (Document objects, entries whose content was not modified).
+            Pages whose content could not be fetched are in neither list.
+        """
+        documents = []
+        not_modified = []
+        etags = etags or {}
+ 
+        for notebook, section, page in page_entries:
+            doc, is_not_modified = self.get_document(notebook, section, page, etags.get(page["id"]))
+            if is_not_modified:
+                not_modified.append((notebook, section, page))
+            elif doc:
+                documents.append(doc)
+ 
+        logger.info(f"Retrieved {len(documents)} documents ({len(not_modified)} not modified)")
+        return documents, not_modified
+ 
+    def get_all_documents(self, notebook_ids: Optional[List[str]] = None) -> List[Document]:
+        """
+        Get all documents from specified notebooks (or all notebooks).
+ 
+        Args:
+            notebook_ids: Optional list of notebook IDs to process
  
-        logger.info(f"Retrieved {len(documents)} documents")
-        return documents
+        Returns:
+            List of Document objects
+        """
+        return self.get_documents(self.list_all_pages(notebook_ids))[0]
    
     def get_rate_limiter_stats(self) -> Dict[str, Any]:
         """
@@ -415,4 +713,9 @@ class OneNoteService:
         stats = self.rate_limiter.get_statistics()
         stats['current_rate'] = self.rate_limiter.requests_per_minute
         return stats
+   
+    def close(self):
+        """Cancel any rate-limit wait in progress and release the HTTP session."""
+        self.rate_limiter.close()
+        self.session.close()
  
\ No newline at end of file
@@ -2,6 +2,8 @@
 Main RAG engine that orchestrates query processing with multimodal support.
 """
 import logging
+import math
+import re
 import time
 import httpx
 from typing import List, Dict, Any, Optional
@@ -19,6 +21,147 @@ from .multimodal_query import MultimodalQueryHandler
 
 logger = logging.getLogger(__name__)
 
+# Optional JIT acceleration for local re-ranking (pip install numba)
+try:
+    import numpy as np
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+# BM25 parameters for local re-ranking
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Connection pool settings for the shared OpenAI HTTP clients
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 50
+HTTP_KEEPALIVE_EXPIRY = 120.0
+HTTP_TIMEOUT = 60.0
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+if _NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _numba_bm25_scores(doc_tokens, doc_offsets, idf, avg_len, k1, b):
+        """
+        Compute BM25 scores over a ragged array of pre-tokenized documents.
+
+        Args:
+            doc_tokens: Flat int32 array of query-term ids (-1 for non-query tokens)
+            doc_offsets: int64 offsets into doc_tokens, one more than the number of docs
+            idf: float32 IDF value per query-term id
+            avg_len: Average document length in tokens
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+
+        Returns:
+            float32 array of scores, one per document
+        """
+        n_docs = doc_offsets.shape[0] - 1
+        n_terms = idf.shape[0]
+        scores = np.zeros(n_docs, dtype=np.float32)
+        tf = np.zeros(n_terms, dtype=np.float32)
+
+        for d in range(n_docs):
+            start = doc_offsets[d]
+            end = doc_offsets[d + 1]
+            tf[:] = 0.0
+            for t in range(start, end):
+                term_id = doc_tokens[t]
+                if term_id >= 0:
+                    tf[term_id] += 1.0
+
+            norm = k1 * (1.0 - b + b * (end - start) / avg_len)
+            score = 0.0
+            for term_id in range(n_terms):
+                freq = tf[term_id]
+                if freq > 0.0:
+                    score += idf[term_id] * freq * (k1 + 1.0) / (freq + norm)
+            scores[d] = score
+
+        return scores
+
+
+def _bm25_scores(question: str, documents: List[Document]) -> List[float]:
+    """
+    Score documents against the question with BM25.
+
+    Uses the Numba kernel when available, otherwise a pure-Python loop
+    producing identical scores.
+
+    Args:
+        question: User question
+        documents: Candidate documents
+
+    Returns:
+        BM25 score per document, in input order
+    """
+    # Map each unique query term to a dense integer id
+    term_ids: Dict[str, int] = {}
+    for token in _TOKEN_PATTERN.findall(question.lower()):
+        term_ids.setdefault(token, len(term_ids))
+
+    n_docs = len(documents)
+    if not term_ids or not n_docs:
+        return [0.0] * n_docs
+
+    # Tokenize every document once into query-term ids (-1 = not a query term)
+    doc_token_ids = [
+        [term_ids.get(token, -1) for token in _TOKEN_PATTERN.findall(doc.page_content.lower())]
+        for doc in documents
+    ]
+
+    doc_freq = [0] * len(term_ids)
+    for ids in doc_token_ids:
+        for term_id in set(ids):
+            if term_id >= 0:
+                doc_freq[term_id] += 1
+
+    idf = [
+        math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        for df in doc_freq
+    ]
+    avg_len = max(sum(len(ids) for ids in doc_token_ids) / n_docs, 1.0)
+
+    if _NUMBA_AVAILABLE:
+        offsets = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in doc_token_ids], out=offsets[1:])
+        flat = np.fromiter(
+            (term_id for ids in doc_token_ids for term_id in ids),
+            dtype=np.int32,
+            count=int(offsets[-1])
+        )
+        scores = _numba_bm25_scores(
+            flat,
+            offsets,
+            np.asarray(idf, dtype=np.float32),
+            avg_len,
+            BM25_K1,
+            BM25_B
+        )
+        return scores.tolist()
+
+    scores = []
+    for ids in doc_token_ids:
+        tf = [0] * len(term_ids)
+        for term_id in ids:
+            if term_id >= 0:
+                tf[term_id] += 1
+
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * len(ids) / avg_len)
+        scores.append(sum(
+            (
+                idf[term_id] * freq * (BM25_K1 + 1.0) / (freq + norm)
+                for term_id, freq in enumerate(tf)
+                if freq
+            ),
+            0.0
+        ))
+
+    return scores
+
 
 class RAGEngine:
     """Main RAG engine for processing queries with multimodal support."""
@@ -39,11 +182,50 @@ class RAGEngine:
         self.default_config = RAGConfig()
         self.multimodal_handler = multimodal_handler
 
+        # Long-lived HTTP/2 clients shared by every LLM call so concurrent
+        # requests multiplex over pooled connections instead of re-handshaking.
+        # SSL verification is disabled for corporate proxies.
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(HTTP_TIMEOUT)
+        self._http_client = httpx.Client(
+            http2=True, verify=False, limits=limits, timeout=timeout
+        )
+        self._http_async_client = httpx.AsyncClient(
+            http2=True, verify=False, limits=limits, timeout=timeout
+        )
+
         if multimodal_handler:
             logger.info("RAG engine initialized with multimodal support")
         else:
             logger.info("RAG engine initialized (text-only mode)")
 
+    def _create_llm(self, config: RAGConfig) -> ChatOpenAI:
+        """
+        Create an LLM for the given configuration on the shared HTTP clients.
+
+        Args:
+            config: RAG configuration
+
+        Returns:
+            ChatOpenAI instance
+        """
+        return ChatOpenAI(
+            model_name=config.model_name,
+            temperature=config.temperature,
+            http_client=self._http_client,
+            http_async_client=self._http_async_client
+        )
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP clients."""
+        self._http_client.close()
+        await self._http_async_client.aclose()
+        logger.debug("Closed RAG engine HTTP clients")
+
     async def query_async(
         self,
         question: str,
@@ -61,21 +243,15 @@ class RAGEngine:
         Returns:
             QueryResponse with answer, sources, and optionally images
         """
-        start_time = time.time()
+        start_time = time.monotonic()
 
         # Use default config if not provided
         if config is None:
             config = self.default_config
 
-        logger.info(f"Processing query: {question[:100]}...")
+        logger.info("Processing query: %s...", question[:100])
 
-        # Initialize LLM with SSL verification disabled for corporate proxies
-        http_client = httpx.Client(verify=False)
-        llm = ChatOpenAI(
-            model_name=config.model_name,
-            temperature=config.temperature,
-            http_client=http_client
-        )
+        llm = self._create_llm(config)
 
         # Get retriever
         retriever = self.vector_store.get_retriever(k=config.retrieval_k)
@@ -92,25 +268,25 @@ class RAGEngine:
         # Check which techniques are enabled and apply them
         if config.multi_query.enabled:
             techniques_used.append("multi_query")
-            retrieved_docs = rag_techniques.multi_query_retrieval(
+            retrieved_docs = await rag_techniques.amulti_query_retrieval(
                 question, retriever, config.multi_query
             )
 
         elif config.rag_fusion.enabled:
             techniques_used.append("rag_fusion")
-            retrieved_docs = rag_techniques.rag_fusion(
+            retrieved_docs = await rag_techniques.arag_fusion(
                 question, retriever, config.rag_fusion
             )
 
         elif config.decomposition.enabled and config.decomposition.mode == "recursive":
             techniques_used.append("decomposition_recursive")
-            answer, retrieved_docs = rag_techniques.decomposition_recursive(
+            answer, retrieved_docs = await rag_techniques.adecomposition_recursive(
                 question, retriever, config.decomposition
             )
             # For decomposition, we already have the answer
             return self._build_response(
                 answer=answer,
-                documents=retrieved_docs,
+                documents=self._dedupe_docs(retrieved_docs),
                 techniques_used=techniques_used,
                 config=config,
                 start_time=start_time
@@ -122,7 +298,7 @@ class RAGEngine:
 
         elif config.step_back.enabled:
             techniques_used.append("step_back")
-            normal_docs, step_back_docs = rag_techniques.step_back_prompting(
+            normal_docs, step_back_docs = await rag_techniques.astep_back_prompting(
                 question, retriever, config.step_back
             )
             retrieved_docs = normal_docs + step_back_docs
@@ -131,6 +307,9 @@ class RAGEngine:
             # Basic retrieval
             retrieved_docs = retriever.get_relevant_documents(question)
 
+        # Drop chunks returned by more than one retrieval before budgeting context
+        retrieved_docs = self._dedupe_docs(retrieved_docs)
+
         # Apply re-ranking if enabled
         if config.reranking.enabled and retrieved_docs:
             techniques_used.append("reranking")
@@ -144,12 +323,18 @@ class RAGEngine:
         # Limit context size to prevent token overflow
         retrieved_docs = self._limit_context_size(retrieved_docs, max_tokens=20000)
 
-        # Log retrieved documents for verification
-        logger.info(f"Retrieved {len(retrieved_docs)} documents for answer generation")
-        for i, doc in enumerate(retrieved_docs[:3], 1):  # Log first 3
-            logger.info(f"  Doc {i}: {doc.metadata.get('page_title', 'N/A')} "
-                       f"[chunk {doc.metadata.get('chunk_index', 'N/A')}/{doc.metadata.get('total_chunks', 'N/A')}] "
-                       f"- {len(doc.page_content)} chars")
+        # Log retrieved documents for verification (skipped entirely above INFO)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Retrieved %d documents for answer generation", len(retrieved_docs))
+            for i, doc in enumerate(retrieved_docs[:3], 1):  # Log first 3
+                logger.info(
+                    "  Doc %d: %s [chunk %s/%s] - %d chars",
+                    i,
+                    doc.metadata.get('page_title', 'N/A'),
+                    doc.metadata.get('chunk_index', 'N/A'),
+                    doc.metadata.get('total_chunks', 'N/A'),
+                    len(doc.page_content)
+                )
 
         # Generate answer
         answer = self._generate_answer(question, retrieved_docs, llm, config)
@@ -182,7 +367,7 @@ class RAGEngine:
             images=images
         )
 
-        logger.info(f"Query processed in {response.metadata.latency_ms}ms")
+        logger.info("Query processed in %dms", response.metadata.latency_ms)
         return response
 
     def query(
@@ -203,21 +388,15 @@ class RAGEngine:
         Returns:
             QueryResponse with answer and metadata
         """
-        start_time = time.time()
+        start_time = time.monotonic()
 
         # Use default config if not provided
         if config is None:
             config = self.default_config
 
-        logger.info(f"Processing query: {question[:100]}...")
+        logger.info("Processing query: %s...", question[:100])
 
-        # Initialize LLM with SSL verification disabled for corporate proxies
-        http_client = httpx.Client(verify=False)
-        llm = ChatOpenAI(
-            model_name=config.model_name,
-            temperature=config.temperature,
-            http_client=http_client
-        )
+        llm = self._create_llm(config)
 
         # Get retriever
         retriever = self.vector_store.get_retriever(k=config.retrieval_k)
@@ -252,7 +431,7 @@ class RAGEngine:
             # For decomposition, we already have the answer
             return self._build_response(
                 answer=answer,
-                documents=retrieved_docs,
+                documents=self._dedupe_docs(retrieved_docs),
                 techniques_used=techniques_used,
                 config=config,
                 start_time=start_time
@@ -273,6 +452,9 @@ class RAGEngine:
             # Basic retrieval
             retrieved_docs = retriever.get_relevant_documents(question)
 
+        # Drop chunks returned by more than one retrieval before budgeting context
+        retrieved_docs = self._dedupe_docs(retrieved_docs)
+
         # Apply re-ranking if enabled
         if config.reranking.enabled and retrieved_docs:
             techniques_used.append("reranking")
@@ -286,12 +468,18 @@ class RAGEngine:
         # Limit context size to prevent token overflow
         retrieved_docs = self._limit_context_size(retrieved_docs, max_tokens=20000)
 
-        # Log retrieved documents for verification
-        logger.info(f"Retrieved {len(retrieved_docs)} documents for answer generation")
-        for i, doc in enumerate(retrieved_docs[:3], 1):  # Log first 3
-            logger.info(f"  Doc {i}: {doc.metadata.get('page_title', 'N/A')} "
-                       f"[chunk {doc.metadata.get('chunk_index', 'N/A')}/{doc.metadata.get('total_chunks', 'N/A')}] "
-                       f"- {len(doc.page_content)} chars")
+        # Log retrieved documents for verification (skipped entirely above INFO)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Retrieved %d documents for answer generation", len(retrieved_docs))
+            for i, doc in enumerate(retrieved_docs[:3], 1):  # Log first 3
+                logger.info(
+                    "  Doc %d: %s [chunk %s/%s] - %d chars",
+                    i,
+                    doc.metadata.get('page_title', 'N/A'),
+                    doc.metadata.get('chunk_index', 'N/A'),
+                    doc.metadata.get('total_chunks', 'N/A'),
+                    len(doc.page_content)
+                )
 
         # Generate answer
         answer = self._generate_answer(question, retrieved_docs, llm, config)
@@ -305,9 +493,39 @@ class RAGEngine:
             start_time=start_time
         )
 
-        logger.info(f"Query processed in {response.metadata.latency_ms}ms")
+        logger.info("Query processed in %dms", response.metadata.latency_ms)
         return response
 
+    def _dedupe_docs(self, documents: List[Document]) -> List[Document]:
+        """
+        Remove duplicate chunks while preserving retrieval order.
+
+        Chunks are identified by (page_id, chunk_index); documents without a
+        page_id fall back to their content.
+
+        Args:
+            documents: Retrieved documents, possibly from several retrievals
+
+        Returns:
+            Documents with duplicates removed
+        """
+        seen: set = set()
+        deduped = []
+
+        for doc in documents:
+            page_id = doc.metadata.get("page_id")
+            if page_id is not None:
+                key = (page_id, doc.metadata.get("chunk_index"))
+            else:
+                key = (None, doc.page_content)
+
+            if key in seen:
+                continue
+            seen.add(key)
+            deduped.append(doc)
+
+        return deduped
+
     def _limit_context_size(
         self,
         documents: List[Document],
@@ -472,6 +690,9 @@ class RAGEngine:
         """
         Apply re-ranking to documents.
 
+        Scores candidates locally with BM25 against the question and keeps
+        the top N.
+
         Args:
             question: User question
             documents: Documents to re-rank
@@ -480,8 +701,11 @@ class RAGEngine:
         Returns:
             Re-ranked documents
         """
-        # Simple re-ranking: return top N documents based on initial retrieval scores
-        return documents[:config.reranking.top_n]
+        scores = _bm25_scores(question, documents)
+
+        # Stable sort keeps the original retrieval order among equal scores
+        order = sorted(range(len(documents)), key=lambda i: -scores[i])
+        return [documents[i] for i in order[:config.reranking.top_n]]
 
     def _build_response(
         self,
@@ -500,24 +724,26 @@ class RAGEngine:
             documents: Retrieved documents
             techniques_used: List of techniques applied
             config: RAG configuration
-            start_time: Query start time
+            start_time: Query start time from time.monotonic()
             images: Optional list of images for multimodal responses
 
         Returns:
             QueryResponse object
         """
         # Calculate latency
-        latency_ms = int((time.time() - start_time) * 1000)
+        latency_ms = int((time.monotonic() - start_time) * 1000)
 
         # Build sources
         sources = []
         for doc in documents:
+            # Slicing past the end is safe, so only the ellipsis is conditional
+            content = doc.page_content
             source = Source(
                 document_id=doc.metadata.get("page_id", "unknown"),
                 page_title=doc.metadata.get("page_title", "Unknown"),
                 notebook_name=doc.metadata.get("notebook_name", "Unknown"),
                 section_name=doc.metadata.get("section_name", "Unknown"),
-                content_snippet=doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                content_snippet=content[:200] + ("..." if len(content) > 200 else ""),
                 relevance_score=0.0,  # Would need to calculate this properly
                 url=doc.metadata.get("url", "")
             )
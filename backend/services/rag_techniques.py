@@ -1,15 +1,24 @@
 """
 Advanced RAG techniques implementation.
 """
+import asyncio
+import hashlib
+import heapq
+import json
 import logging
-from typing import List, Dict, Any
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Hashable, Optional, Tuple
 from operator import itemgetter
  
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
-from langchain_core.load import dumps, loads
  
 from models.rag_config import (
     MultiQueryConfig,
@@ -21,38 +30,508 @@ from models.rag_config import (
  
 logger = logging.getLogger(__name__)
  
+# Optional JIT acceleration for reciprocal rank fusion (pip install numba)
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+ 
+# Optional linear-time DFA regex engine for parsing LLM output (pip install google-re2)
+try:
+    import re2 as _line_regex
+except ImportError:
+    _line_regex = re
+ 
+# Maximum number of retriever calls in flight at once for async fan-out
+DEFAULT_MAX_CONCURRENCY = 5
+ 
+# Per-document character cap when formatting retrieved context into a prompt
+DEFAULT_PER_DOC_CHAR_CAP = 1500
+ 
+# Ranks covered by the shared RRF weight tables (longer lists get their own table)
+RRF_LUT_SIZE = 1024
+ 
+# Process-wide memo of generated HyDE passages and step-back questions.
+# Bump GENERATION_PROMPT_VERSION whenever those prompts change.
+GENERATION_CACHE_SIZE = 256
+GENERATION_PROMPT_VERSION = "v1"
+_generation_cache: "OrderedDict[str, str]" = OrderedDict()
+_generation_cache_lock = threading.Lock()
+ 
+# One non-blank line of LLM output, without surrounding whitespace
+_LINE_RE = _line_regex.compile(r"[ \t]*(\S[^\n]*?)[ \t\r]*(?:\n|$)")
+ 
+ 
+if _NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _numba_rrf_scores(flat_ids, list_offsets, rrf_lut, n_unique):
+        """
+        Accumulate reciprocal rank fusion scores over a ragged array of ranked lists.
+ 
+        Args:
+            flat_ids: Flat int64 array of document ids, list after list
+            list_offsets: int64 offsets into flat_ids, one more than the number of lists
+            rrf_lut: float64 RRF weight per rank, covering the longest list
+            n_unique: Number of unique document ids
+ 
+        Returns:
+            float64 array of fused scores, one per document id
+        """
+        scores = np.zeros(n_unique, dtype=np.float64)
+        for li in range(list_offsets.shape[0] - 1):
+            start = list_offsets[li]
+            for rank in range(list_offsets[li + 1] - start):
+                scores[flat_ids[start + rank]] += rrf_lut[rank]
+        return scores
+ 
+ 
+@lru_cache(maxsize=8)
+def _rrf_lut(k: int, max_rank: int = RRF_LUT_SIZE) -> np.ndarray:
+    """
+    Precompute the reciprocal rank fusion weight 1 / (rank + k) per rank.
+ 
+    Args:
+        k: RRF constant
+        max_rank: Number of ranks to cover
+ 
+    Returns:
+        Read-only float64 array of weights, shared across calls
+    """
+    lut = 1.0 / (np.arange(max_rank, dtype=np.float64) + k)
+    lut.setflags(write=False)
+    return lut
+ 
+ 
+@lru_cache(maxsize=64)
+def _prompt_from_template(template: str) -> ChatPromptTemplate:
+    """
+    Parse a prompt template once and reuse it across calls.
+ 
+    Templates only vary with config values (e.g. number of queries), so the
+    rendered template string is a small, stable cache key.
+ 
+    Args:
+        template: Template string with runtime placeholders
+ 
+    Returns:
+        Parsed prompt template
+    """
+    return ChatPromptTemplate.from_template(template)
+ 
+ 
+def _dedupe_queries(queries: List[str]) -> List[str]:
+    """
+    Drop case-insensitive duplicates from generated queries.
+ 
+    Args:
+        queries: Stripped, non-blank generated queries
+ 
+    Returns:
+        Unique queries in first-seen order, with their original casing
+    """
+    unique_queries = {}
+    for query in queries:
+        unique_queries.setdefault(query.casefold(), query)
+    return list(unique_queries.values())
+ 
+ 
+def _format_context(
+    docs: List[Document],
+    char_budget: int,
+    per_doc_cap: int = DEFAULT_PER_DOC_CHAR_CAP
+) -> str:
+    """
+    Join document contents into a prompt context within a character budget.
+ 
+    Args:
+        docs: Retrieved documents, most relevant first
+        char_budget: Maximum total characters of context
+        per_doc_cap: Maximum characters taken from any single document
+ 
+    Returns:
+        Context string with documents separated by blank lines
+    """
+    parts = []
+    used = 0
+    for doc in docs:
+        remaining = char_budget - used
+        if remaining <= 0:
+            break
+        part = doc.page_content[:min(per_doc_cap, remaining)]
+        parts.append(part)
+        used += len(part) + 2
+    return "\n\n".join(parts)
+ 
+ 
+def _get_cached_generation(key: str) -> Optional[str]:
+    """Return a memoized generation, marking it most recently used."""
+    with _generation_cache_lock:
+        value = _generation_cache.get(key)
+        if value is not None:
+            _generation_cache.move_to_end(key)
+        return value
+ 
+ 
+def _store_generation(key: str, value: str) -> None:
+    """Memoize a generation, evicting the least recently used entries."""
+    with _generation_cache_lock:
+        _generation_cache[key] = value
+        _generation_cache.move_to_end(key)
+        while len(_generation_cache) > GENERATION_CACHE_SIZE:
+            _generation_cache.popitem(last=False)
+ 
+ 
+@lru_cache(maxsize=1)
+def _step_back_prompt() -> ChatPromptTemplate:
+    """
+    Build the few-shot step-back prompt once.
+ 
+    Returns:
+        Step-back prompt template
+    """
+    # Few-shot examples for step-back
+    examples = [
+        {
+            "input": "Could the members of The Police perform lawful arrests?",
+            "output": "what can the members of The Police do?",
+        },
+        {
+            "input": "Jan Sindel's was born in what country?",
+            "output": "what is Jan Sindel's personal history?",
+        },
+    ]
+ 
+    example_prompt = ChatPromptTemplate.from_messages([
+        ("human", "{input}"),
+        ("ai", "{output}"),
+    ])
+ 
+    few_shot_prompt = FewShotChatMessagePromptTemplate(
+        example_prompt=example_prompt,
+        examples=examples,
+    )
+ 
+    prompt = ChatPromptTemplate.from_messages([
+        (
+            "system",
+            """You are an expert question abstraction specialist. Your task is to generate a broader, more general "step-back" question that provides foundational context for answering the specific original question.
+ 
+**PRINCIPLES:**
+1. **Generalize:** Remove specific details while keeping the core domain
+2. **Broaden Scope:** Ask about concepts, principles, or categories rather than instances
+3. **Foundation First:** Target background knowledge needed to understand the specific question
+4. **Maintain Relevance:** Stay within the same domain/topic area
+ 
+**EXAMPLES:**""",
+        ),
+        few_shot_prompt,
+        ("user", "{question}"),
+    ])
+ 
+    return prompt
+ 
+ 
+class RankedLists:
+    """
+    Ranked document lists stored as integer ids into a shared document table.
+ 
+    Each unique document is registered once; ranking and de-duplication then
+    work on contiguous id arrays and only touch Documents when materializing.
+    """
+ 
+    def __init__(self, key_fn: Callable[[Document], Hashable]):
+        """
+        Initialize empty ranked lists.
+ 
+        Args:
+            key_fn: Function returning a hashable identity key for a document
+        """
+        self.key_fn = key_fn
+        self.doc_table: List[Document] = []
+        self.key_to_id: Dict[Hashable, int] = {}
+        self.lists: List[np.ndarray] = []
+        # Identity fast path: the same Document object returned by several
+        # retrievals skips key building. Holding the object keeps id() unique.
+        self._object_ids: Dict[int, Tuple[Document, int]] = {}
+ 
+    @classmethod
+    def from_doc_lists(
+        cls,
+        doc_lists: List[List[Document]],
+        key_fn: Callable[[Document], Hashable]
+    ) -> "RankedLists":
+        """
+        Register every document of several ranked lists.
+ 
+        Args:
+            doc_lists: Ranked document lists
+            key_fn: Function returning a hashable identity key for a document
+ 
+        Returns:
+            Populated RankedLists
+        """
+        ranked = cls(key_fn)
+        for docs in doc_lists:
+            ranked.add_list(docs)
+        return ranked
+ 
+    def register(self, doc: Document) -> int:
+        """
+        Get the id of a document, adding it to the table if unseen.
+ 
+        Args:
+            doc: Document to register
+ 
+        Returns:
+            Dense integer id, assigned in first-seen order
+        """
+        entry = self._object_ids.get(id(doc))
+        if entry is not None and entry[0] is doc:
+            return entry[1]
+ 
+        key = self.key_fn(doc)
+        doc_id = self.key_to_id.get(key)
+        if doc_id is None:
+            doc_id = self.key_to_id[key] = len(self.doc_table)
+            self.doc_table.append(doc)
+        self._object_ids[id(doc)] = (doc, doc_id)
+        return doc_id
+ 
+    def add_list(self, docs: List[Document]) -> np.ndarray:
+        """
+        Register a ranked list of documents.
+ 
+        Args:
+            docs: Documents in rank order
+ 
+        Returns:
+            int64 array of document ids in rank order
+        """
+        ids = np.fromiter((self.register(doc) for doc in docs), dtype=np.int64, count=len(docs))
+        self.lists.append(ids)
+        return ids
+ 
  
 class RAGTechniques:
     """Implementation of advanced RAG techniques."""
  
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(self, llm: ChatOpenAI, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
         """
         Initialize RAG techniques.
  
         Args:
             llm: Language model instance
+            max_concurrency: Maximum concurrent retriever calls in async techniques
         """
         self.llm = llm
+        self.max_concurrency = max_concurrency
+        # Retrieval results keyed by (retriever id, query), so repeated queries
+        # across techniques and sub-questions skip the vector store round-trip
+        self._retrieval_cache: Dict[Tuple[int, str], List[Document]] = {}
  
-    def multi_query_retrieval(
+    def _generation_key(self, kind: str, question: str) -> str:
+        """
+        Build the memo key for a generated passage or question.
+ 
+        Args:
+            kind: Generation type (e.g. "hyde", "step_back")
+            question: Original question
+ 
+        Returns:
+            Hex digest of the question, model settings and prompt version
+        """
+        model_name = getattr(self.llm, "model_name", "")
+        temperature = getattr(self.llm, "temperature", None)
+        raw = f"{kind}|{GENERATION_PROMPT_VERSION}|{model_name}|{temperature}|{question}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+ 
+    def _generate_cached(self, kind: str, chain: Any, question: str) -> str:
+        """
+        Run a generation chain, reusing a memoized result for the same question.
+ 
+        Args:
+            kind: Generation type used in the memo key
+            chain: Runnable taking {"question": ...} and returning a string
+            question: Original question
+ 
+        Returns:
+            Generated text
+        """
+        key = self._generation_key(kind, question)
+        result = _get_cached_generation(key)
+        if result is None:
+            result = chain.invoke({"question": question})
+            _store_generation(key, result)
+        else:
+            logger.debug(f"Reusing cached {kind} generation")
+        return result
+ 
+    async def _agenerate_cached(self, kind: str, chain: Any, question: str) -> str:
+        """Async variant of _generate_cached."""
+        key = self._generation_key(kind, question)
+        result = _get_cached_generation(key)
+        if result is None:
+            result = await chain.ainvoke({"question": question})
+            _store_generation(key, result)
+        else:
+            logger.debug(f"Reusing cached {kind} generation")
+        return result
+ 
+    def _retrieve(self, retriever: Any, query: str) -> List[Document]:
+        """
+        Retrieve documents for a query, reusing cached results.
+ 
+        Args:
+            retriever: Retriever instance
+            query: Query to retrieve for
+ 
+        Returns:
+            Retrieved documents
+        """
+        key = (id(retriever), query)
+        docs = self._retrieval_cache.get(key)
+        if docs is None:
+            docs = self._retrieval_cache[key] = retriever.invoke(query)
+        return docs
+ 
+    def _retrieve_many(self, retriever: Any, queries: List[str]) -> List[List[Document]]:
+        """
+        Retrieve documents for several queries with one batched retriever call.
+ 
+        Args:
+            retriever: Retriever instance
+            queries: Queries to retrieve for
+ 
+        Returns:
+            One document list per query, in query order
+        """
+        missing = [q for q in queries if (id(retriever), q) not in self._retrieval_cache]
+        if missing:
+            results = retriever.batch(missing, config={"max_concurrency": self.max_concurrency})
+            for query, docs in zip(missing, results):
+                self._retrieval_cache[(id(retriever), query)] = docs
+        return [self._retrieval_cache[(id(retriever), q)] for q in queries]
+ 
+    def _stream_queries_and_retrieve(
         self,
+        generate_queries: Any,
         question: str,
+        retriever: Any
+    ) -> Tuple[List[str], List[List[Document]]]:
+        """
+        Generate queries while speculatively retrieving for the first one.
+ 
+        The first complete line usually arrives long before the LLM finishes,
+        so its retrieval runs in the background during the rest of generation;
+        the remaining queries are then retrieved in one batch.
+ 
+        Args:
+            generate_queries: Runnable streaming newline-separated queries
+            question: Original question
+            retriever: Retriever instance
+ 
+        Returns:
+            Tuple of (queries, one document list per query)
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first_query = None
+            first_future = None
+            buffer = ""
+            for chunk in generate_queries.stream({"question": question}):
+                buffer += chunk
+                if first_future is None and "\n" in buffer:
+                    complete_lines = _LINE_RE.findall(buffer[:buffer.rindex("\n") + 1])
+                    if complete_lines:
+                        first_query = complete_lines[0]
+                        first_future = executor.submit(self._retrieve, retriever, first_query)
+ 
+            queries = _dedupe_queries(_LINE_RE.findall(buffer))
+            self._retrieve_many(retriever, [q for q in queries if q != first_query])
+            if first_future is not None:
+                first_future.result()
+ 
+        return queries, self._retrieve_many(retriever, queries)
+ 
+    async def _abounded_retrieve(
+        self,
         retriever: Any,
-        config: MultiQueryConfig
+        query: str,
+        semaphore: asyncio.Semaphore
     ) -> List[Document]:
+        """Retrieve documents for one query while holding the concurrency semaphore."""
+        key = (id(retriever), query)
+        docs = self._retrieval_cache.get(key)
+        if docs is None:
+            async with semaphore:
+                docs = await retriever.ainvoke(query)
+            self._retrieval_cache[key] = docs
+        return docs
+ 
+    async def _astream_queries_and_retrieve(
+        self,
+        generate_queries: Any,
+        question: str,
+        retriever: Any,
+        max_queries: Optional[int] = None
+    ) -> Tuple[List[str], List[List[Document]]]:
         """
-        Multi-query retrieval: Generate multiple query perspectives.
+        Stream generated queries and overlap their retrieval with generation.
+ 
+        Each newline-terminated query starts its retrieval immediately, so
+        retrieval I/O runs while the LLM is still producing later queries.
  
         Args:
+            generate_queries: Runnable streaming newline-separated queries
             question: Original question
             retriever: Retriever instance
-            config: Multi-query configuration
+            max_queries: Optional cap on the number of queries to use
  
         Returns:
-            List of unique retrieved documents
+            Tuple of (queries, one document list per query)
         """
-        logger.info(f"Applying multi-query retrieval with {config.num_queries} queries")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        queries: List[str] = []
+        seen = set()
+        tasks: List[asyncio.Task] = []
+ 
+        def start(line: str) -> None:
+            query = line.strip()
+            if not query or query.casefold() in seen:
+                return
+            if max_queries is not None and len(queries) >= max_queries:
+                return
+            seen.add(query.casefold())
+            queries.append(query)
+            tasks.append(asyncio.create_task(
+                self._abounded_retrieve(retriever, query, semaphore)
+            ))
+ 
+        buffer = ""
+        try:
+            async for chunk in generate_queries.astream({"question": question}):
+                buffer += chunk
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    start(line)
+            start(buffer)
+ 
+            return queries, list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+ 
+    def _multi_query_chain(self, config: MultiQueryConfig) -> Any:
+        """
+        Build the chain that generates multi-query reformulations.
  
+        Args:
+            config: Multi-query configuration
+ 
+        Returns:
+            Runnable producing the generated queries, one per line
+        """
         # Prompt for generating multiple queries
         template = f"""You are an expert search query optimization assistant specializing in information retrieval from document databases.
  
@@ -76,51 +555,88 @@ class RAGTechniques:
  
 **OUTPUT (one query per line):**"""
  
-        prompt = ChatPromptTemplate.from_template(template)
+        prompt = _prompt_from_template(template)
+ 
+        return prompt | self.llm | StrOutputParser()
+ 
+    def multi_query_retrieval(
+        self,
+        question: str,
+        retriever: Any,
+        config: MultiQueryConfig
+    ) -> List[Document]:
+        """
+        Multi-query retrieval: Generate multiple query perspectives.
+ 
+        Args:
+            question: Original question
+            retriever: Retriever instance
+            config: Multi-query configuration
+ 
+        Returns:
+            List of unique retrieved documents
+        """
+        logger.info(f"Applying multi-query retrieval with {config.num_queries} queries")
  
         # Generate queries
-        generate_queries = (
-            prompt
-            | self.llm
-            | StrOutputParser()
-            | (lambda x: x.split("\n"))
-        )
+        generate_queries = self._multi_query_chain(config)
  
-        queries = generate_queries.invoke({"question": question})
-        queries = [q.strip() for q in queries if q.strip()]
+        # Prefetch the first query while the rest are generated, then batch the others
+        queries, all_docs = self._stream_queries_and_retrieve(
+            generate_queries, question, retriever
+        )
         logger.debug(f"Generated queries: {queries}")
  
-        # Retrieve for each query
-        all_docs = []
-        for query in queries:
-            docs = retriever.invoke(query)
-            all_docs.append(docs)
- 
         # Get unique documents
         unique_docs = self._get_unique_union(all_docs)
         logger.info(f"Multi-query retrieved {len(unique_docs)} unique documents")
  
         return unique_docs
  
-    def rag_fusion(
+    async def amulti_query_retrieval(
         self,
         question: str,
         retriever: Any,
-        config: RAGFusionConfig
+        config: MultiQueryConfig
     ) -> List[Document]:
         """
-        RAG-Fusion: Generate related queries and apply reciprocal rank fusion.
+        Async multi-query retrieval with concurrent retriever fan-out.
  
         Args:
             question: Original question
             retriever: Retriever instance
-            config: RAG-Fusion configuration
+            config: Multi-query configuration
  
         Returns:
-            List of re-ranked documents
+            List of unique retrieved documents
         """
-        logger.info(f"Applying RAG-Fusion with {config.num_queries} queries")
+        logger.info(f"Applying multi-query retrieval with {config.num_queries} queries")
  
+        # Generate queries
+        generate_queries = self._multi_query_chain(config)
+ 
+        # Stream the queries and start each retrieval as soon as its line is complete
+        queries, all_docs = await self._astream_queries_and_retrieve(
+            generate_queries, question, retriever
+        )
+        logger.debug(f"Generated queries: {queries}")
+ 
+        # Get unique documents
+        unique_docs = self._get_unique_union(all_docs)
+        logger.info(f"Multi-query retrieved {len(unique_docs)} unique documents")
+ 
+        return unique_docs
+ 
+    def _rag_fusion_chain(self, config: RAGFusionConfig) -> Any:
+        """
+        Build the chain that generates RAG-Fusion related queries.
+ 
+        Args:
+            config: RAG-Fusion configuration
+ 
+        Returns:
+            Runnable producing the generated queries, one per line
+        """
         # Prompt for generating related queries
         template = f"""You are an advanced search query generation specialist optimizing retrieval through query diversification.
  
@@ -145,51 +661,92 @@ class RAGTechniques:
  
 **GENERATED QUERIES (one per line):**"""
  
-        prompt = ChatPromptTemplate.from_template(template)
+        prompt = _prompt_from_template(template)
+ 
+        return prompt | self.llm | StrOutputParser()
+ 
+    def rag_fusion(
+        self,
+        question: str,
+        retriever: Any,
+        config: RAGFusionConfig
+    ) -> List[Document]:
+        """
+        RAG-Fusion: Generate related queries and apply reciprocal rank fusion.
+ 
+        Args:
+            question: Original question
+            retriever: Retriever instance
+            config: RAG-Fusion configuration
+ 
+        Returns:
+            List of re-ranked documents
+        """
+        logger.info(f"Applying RAG-Fusion with {config.num_queries} queries")
  
         # Generate queries
-        generate_queries = (
-            prompt
-            | self.llm
-            | StrOutputParser()
-            | (lambda x: x.split("\n"))
-        )
+        generate_queries = self._rag_fusion_chain(config)
  
-        queries = generate_queries.invoke({"question": question})
-        queries = [q.strip() for q in queries if q.strip()]
+        # Prefetch the first query while the rest are generated, then batch the others
+        queries, all_docs = self._stream_queries_and_retrieve(
+            generate_queries, question, retriever
+        )
         logger.debug(f"Generated fusion queries: {queries}")
  
-        # Retrieve for each query
-        all_docs = []
-        for query in queries:
-            docs = retriever.invoke(query)
-            all_docs.append(docs)
- 
         # Apply reciprocal rank fusion
-        reranked_docs = self._reciprocal_rank_fusion(all_docs, k=config.rrf_k)
+        reranked_docs = self._reciprocal_rank_fusion(
+            all_docs, k=config.rrf_k, top_k=config.top_k
+        )
         logger.info(f"RAG-Fusion retrieved {len(reranked_docs)} documents")
  
         return reranked_docs
  
-    def decomposition_recursive(
+    async def arag_fusion(
         self,
         question: str,
         retriever: Any,
-        config: DecompositionConfig
-    ) -> tuple[str, List[Document]]:
+        config: RAGFusionConfig
+    ) -> List[Document]:
         """
-        Query decomposition with recursive answering.
+        Async RAG-Fusion with concurrent retriever fan-out.
  
         Args:
             question: Original question
             retriever: Retriever instance
-            config: Decomposition configuration
+            config: RAG-Fusion configuration
  
         Returns:
-            Tuple of (final_answer, all_documents_used)
+            List of re-ranked documents
         """
-        logger.info(f"Applying recursive decomposition")
+        logger.info(f"Applying RAG-Fusion with {config.num_queries} queries")
  
+        # Generate queries
+        generate_queries = self._rag_fusion_chain(config)
+ 
+        # Stream the queries and start each retrieval as soon as its line is complete
+        queries, all_docs = await self._astream_queries_and_retrieve(
+            generate_queries, question, retriever
+        )
+        logger.debug(f"Generated fusion queries: {queries}")
+ 
+        # Apply reciprocal rank fusion
+        reranked_docs = self._reciprocal_rank_fusion(
+            all_docs, k=config.rrf_k, top_k=config.top_k
+        )
+        logger.info(f"RAG-Fusion retrieved {len(reranked_docs)} documents")
+ 
+        return reranked_docs
+ 
+    def _decomposition_chain(self, config: DecompositionConfig) -> Any:
+        """
+        Build the chain that decomposes a question into sub-questions.
+ 
+        Args:
+            config: Decomposition configuration
+ 
+        Returns:
+            Runnable producing the sub-questions, one per line
+        """
         # Generate sub-questions
         decomposition_template = f"""You are an expert question decomposition specialist skilled in breaking complex queries into atomic sub-questions.
  
@@ -214,20 +771,17 @@ Main Question: {{question}}
  
 **OUTPUT (exactly {config.max_sub_questions} sub-questions, one per line, no numbering):**"""
  
-        decomposition_prompt = ChatPromptTemplate.from_template(decomposition_template)
+        decomposition_prompt = _prompt_from_template(decomposition_template)
  
-        generate_queries = (
-            decomposition_prompt
-            | self.llm
-            | StrOutputParser()
-            | (lambda x: x.split("\n"))
-        )
+        return decomposition_prompt | self.llm | StrOutputParser()
  
-        sub_questions = generate_queries.invoke({"question": question})
-        sub_questions = [q.strip() for q in sub_questions if q.strip()][:config.max_sub_questions]
-        logger.debug(f"Generated sub-questions: {sub_questions}")
+    def _decomposition_answer_prompt(self) -> ChatPromptTemplate:
+        """
+        Build the prompt that answers one sub-question in the recursive loop.
  
-        # Answer sub-questions recursively
+        Returns:
+            Answer prompt template
+        """
         answer_template = """You are a precise question-answering assistant working within a recursive decomposition framework.
  
 **YOUR TASK:** Answer the current sub-question using:
@@ -252,39 +806,127 @@ Main Question: {{question}}
  
 **YOUR ANSWER:**"""
  
-        answer_prompt = ChatPromptTemplate.from_template(answer_template)
+        return _prompt_from_template(answer_template)
+ 
+    def decomposition_recursive(
+        self,
+        question: str,
+        retriever: Any,
+        config: DecompositionConfig
+    ) -> tuple[str, List[Document]]:
+        """
+        Query decomposition with recursive answering.
+ 
+        Args:
+            question: Original question
+            retriever: Retriever instance
+            config: Decomposition configuration
+ 
+        Returns:
+            Tuple of (final_answer, all_documents_used)
+        """
+        logger.info(f"Applying recursive decomposition")
+ 
+        # Generate sub-questions
+        generate_queries = self._decomposition_chain(config)
+ 
+        sub_questions = _LINE_RE.findall(generate_queries.invoke({"question": question}))
+        sub_questions = _dedupe_queries(sub_questions)[:config.max_sub_questions]
+        logger.debug(f"Generated sub-questions: {sub_questions}")
+ 
+        # Answer sub-questions recursively
+        rag_chain = self._decomposition_answer_prompt() | self.llm | StrOutputParser()
  
-        q_a_pairs = ""
+        qa_parts: List[str] = []
         all_docs = []
  
         for sub_q in sub_questions:
             # Retrieve documents
-            docs = retriever.invoke(sub_q)
+            docs = self._retrieve(retriever, sub_q)
             all_docs.extend(docs)
  
             # Format context
-            context = "\n\n".join([doc.page_content for doc in docs])
+            context = _format_context(docs, config.context_char_budget)
  
             # Generate answer
-            rag_chain = (
-                answer_prompt
-                | self.llm
-                | StrOutputParser()
-            )
- 
             answer = rag_chain.invoke({
                 "question": sub_q,
-                "q_a_pairs": q_a_pairs,
+                "q_a_pairs": "".join(qa_parts[-config.qa_window:]),
                 "context": context
             })
  
-            # Update Q&A pairs
-            q_a_pairs += f"\n---\nQuestion: {sub_q}\nAnswer: {answer}\n\n"
+            # Update Q&A pairs (only the most recent qa_window are sent to the LLM)
+            qa_parts.append(f"\n---\nQuestion: {sub_q}\nAnswer: {answer}\n\n")
  
         # Final answer is the last one generated
         logger.info(f"Decomposition used {len(all_docs)} total document retrievals")
         return answer, all_docs
  
+    async def adecomposition_recursive(
+        self,
+        question: str,
+        retriever: Any,
+        config: DecompositionConfig
+    ) -> tuple[str, List[Document]]:
+        """
+        Async query decomposition with prefetched sub-question retrievals.
+ 
+        Sub-question retrievals are independent of earlier answers, so they
+        all run concurrently (overlapping sub-question generation) before the
+        sequential answering loop.
+ 
+        Args:
+            question: Original question
+            retriever: Retriever instance
+            config: Decomposition configuration
+ 
+        Returns:
+            Tuple of (final_answer, all_documents_used)
+        """
+        logger.info(f"Applying recursive decomposition")
+ 
+        # Generate sub-questions and prefetch their documents
+        generate_queries = self._decomposition_chain(config)
+        sub_questions, docs_per_sub = await self._astream_queries_and_retrieve(
+            generate_queries, question, retriever, max_queries=config.max_sub_questions
+        )
+        logger.debug(f"Generated sub-questions: {sub_questions}")
+ 
+        # Answer sub-questions recursively
+        rag_chain = self._decomposition_answer_prompt() | self.llm | StrOutputParser()
+ 
+        qa_parts: List[str] = []
+        all_docs = []
+        answer = ""
+ 
+        for sub_q, docs in zip(sub_questions, docs_per_sub):
+            all_docs.extend(docs)
+ 
+            # Format context
+            context = _format_context(docs, config.context_char_budget)
+ 
+            answer = await rag_chain.ainvoke({
+                "question": sub_q,
+                "q_a_pairs": "".join(qa_parts[-config.qa_window:]),
+                "context": context
+            })
+ 
+            # Update Q&A pairs (only the most recent qa_window are sent to the LLM)
+            qa_parts.append(f"\n---\nQuestion: {sub_q}\nAnswer: {answer}\n\n")
+ 
+        # Final answer is the last one generated
+        logger.info(f"Decomposition used {len(all_docs)} total document retrievals")
+        return answer, all_docs
+ 
+    def _step_back_chain(self) -> Any:
+        """
+        Build the chain that generates a step-back question.
+ 
+        Returns:
+            Runnable producing the step-back question
+        """
+        return _step_back_prompt() | self.llm | StrOutputParser()
+ 
     def step_back_prompting(
         self,
         question: str,
@@ -304,57 +946,70 @@ Main Question: {{question}}
         """
         logger.info("Applying step-back prompting")
  
-        # Few-shot examples for step-back
-        examples = [
-            {
-                "input": "Could the members of The Police perform lawful arrests?",
-                "output": "what can the members of The Police do?",
-            },
-            {
-                "input": "Jan Sindel's was born in what country?",
-                "output": "what is Jan Sindel's personal history?",
-            },
-        ]
- 
-        example_prompt = ChatPromptTemplate.from_messages([
-            ("human", "{input}"),
-            ("ai", "{output}"),
-        ])
- 
-        few_shot_prompt = FewShotChatMessagePromptTemplate(
-            example_prompt=example_prompt,
-            examples=examples,
-        )
+        generate_step_back = self._step_back_chain()
  
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                """You are an expert question abstraction specialist. Your task is to generate a broader, more general "step-back" question that provides foundational context for answering the specific original question.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # The original question needs no LLM call, so retrieve it in the
+            # background while the step-back question is generated
+            normal_future = None
+            if config.include_original:
+                normal_future = executor.submit(self._retrieve, retriever, question)
  
-**PRINCIPLES:**
-1. **Generalize:** Remove specific details while keeping the core domain
-2. **Broaden Scope:** Ask about concepts, principles, or categories rather than instances
-3. **Foundation First:** Target background knowledge needed to understand the specific question
-4. **Maintain Relevance:** Stay within the same domain/topic area
+            # Generate step-back question
+            step_back_question = self._generate_cached("step_back", generate_step_back, question)
+            logger.debug(f"Step-back question: {step_back_question}")
  
-**EXAMPLES:**""",
-            ),
-            few_shot_prompt,
-            ("user", "{question}"),
-        ])
+            step_back_docs = self._retrieve(retriever, step_back_question)
+            normal_docs = normal_future.result() if normal_future else []
+ 
+        logger.info(f"Step-back retrieved {len(normal_docs)} normal + {len(step_back_docs)} step-back docs")
+        return normal_docs, step_back_docs
  
-        generate_step_back = prompt | self.llm | StrOutputParser()
+    async def astep_back_prompting(
+        self,
+        question: str,
+        retriever: Any,
+        config: StepBackConfig
+    ) -> tuple[List[Document], List[Document]]:
+        """
+        Async step-back prompting with the original-question retrieval
+        overlapping step-back generation.
  
-        # Generate step-back question
-        step_back_question = generate_step_back.invoke({"question": question})
-        logger.debug(f"Step-back question: {step_back_question}")
+        Args:
+            question: Original question
+            retriever: Retriever instance
+            config: Step-back configuration
  
-        # Retrieve with both questions
-        normal_docs = []
+        Returns:
+            Tuple of (normal_docs, step_back_docs)
+        """
+        logger.info("Applying step-back prompting")
+ 
+        generate_step_back = self._step_back_chain()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+ 
+        # Start the original-question retrieval before generating
+        normal_task = None
         if config.include_original:
-            normal_docs = retriever.invoke(question)
+            normal_task = asyncio.create_task(
+                self._abounded_retrieve(retriever, question, semaphore)
+            )
  
-        step_back_docs = retriever.invoke(step_back_question)
+        try:
+            # Generate step-back question
+            step_back_question = await self._agenerate_cached(
+                "step_back", generate_step_back, question
+            )
+            logger.debug(f"Step-back question: {step_back_question}")
+ 
+            step_back_docs = await self._abounded_retrieve(
+                retriever, step_back_question, semaphore
+            )
+            normal_docs = await normal_task if normal_task else []
+        except BaseException:
+            if normal_task:
+                normal_task.cancel()
+            raise
  
         logger.info(f"Step-back retrieved {len(normal_docs)} normal + {len(step_back_docs)} step-back docs")
         return normal_docs, step_back_docs
@@ -392,7 +1047,7 @@ Main Question: {{question}}
  
 **HYPOTHETICAL DOCUMENT PASSAGE:**"""
  
-        prompt = ChatPromptTemplate.from_template(template)
+        prompt = _prompt_from_template(template)
  
         generate_docs = (
             prompt
@@ -400,7 +1055,7 @@ Main Question: {{question}}
             | StrOutputParser()
         )
  
-        hypothetical_doc = generate_docs.invoke({"question": question})
+        hypothetical_doc = self._generate_cached("hyde", generate_docs, question)
         logger.debug(f"Generated hypothetical document: {hypothetical_doc[:100]}...")
  
         # Retrieve using hypothetical document
@@ -409,6 +1064,22 @@ Main Question: {{question}}
         logger.info(f"HyDE retrieved {len(docs)} documents")
         return docs
  
+    def _doc_key(self, doc: Document) -> tuple:
+        """
+        Build a hashable identity key for a document.
+ 
+        Args:
+            doc: Document to key
+ 
+        Returns:
+            Tuple of page content and metadata
+        """
+        try:
+            return (doc.page_content, frozenset(doc.metadata.items()))
+        except TypeError:
+            # Unhashable metadata values (e.g. lists) fall back to canonical JSON
+            return (doc.page_content, json.dumps(doc.metadata, sort_keys=True, default=str))
+ 
     def _get_unique_union(self, doc_lists: List[List[Document]]) -> List[Document]:
         """
         Get unique union of documents from multiple lists.
@@ -417,16 +1088,24 @@ Main Question: {{question}}
             doc_lists: List of document lists
  
         Returns:
-            List of unique documents
+            List of unique documents, in first-seen order
         """
-        flattened_docs = [dumps(doc) for sublist in doc_lists for doc in sublist]
-        unique_docs = list(set(flattened_docs))
-        return [loads(doc) for doc in unique_docs]
+        # Single streaming pass; no id arrays are needed for a plain union
+        seen = set()
+        unique_docs = []
+        for sublist in doc_lists:
+            for doc in sublist:
+                key = self._doc_key(doc)
+                if key not in seen:
+                    seen.add(key)
+                    unique_docs.append(doc)
+        return unique_docs
  
     def _reciprocal_rank_fusion(
         self,
         doc_lists: List[List[Document]],
-        k: int = 60
+        k: int = 60,
+        top_k: Optional[int] = None
     ) -> List[Document]:
         """
         Apply reciprocal rank fusion to re-rank documents.
@@ -434,23 +1113,42 @@ Main Question: {{question}}
         Args:
             doc_lists: List of ranked document lists
             k: RRF constant
+            top_k: Number of top documents to return (all if None)
  
         Returns:
             Re-ranked documents
         """
-        fused_scores = {}
- 
-        for docs in doc_lists:
-            for rank, doc in enumerate(docs):
-                doc_str = dumps(doc)
-                if doc_str not in fused_scores:
-                    fused_scores[doc_str] = 0
-                fused_scores[doc_str] += 1 / (rank + k)
- 
-        reranked_results = [
-            loads(doc)
-            for doc, score in sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-        ]
+        # Assign each unique document a dense integer id
+        ranked = RankedLists.from_doc_lists(doc_lists, self._doc_key)
+        id_to_doc = ranked.doc_table
+ 
+        if not id_to_doc:
+            return []
+ 
+        # Shared 1 / (rank + k) weights, computed once per k
+        max_rank = max(len(ids) for ids in ranked.lists)
+        rrf_lut = _rrf_lut(k, max(max_rank, RRF_LUT_SIZE))
+ 
+        if _NUMBA_AVAILABLE:
+            # Single compiled pass over the ragged id lists
+            offsets = np.zeros(len(ranked.lists) + 1, dtype=np.int64)
+            np.cumsum([len(ids) for ids in ranked.lists], out=offsets[1:])
+            flat = np.concatenate(ranked.lists)
+            scores = _numba_rrf_scores(flat, offsets, rrf_lut, len(id_to_doc))
+        else:
+            # Accumulate the weights per document with one vectorized add per list
+            scores = np.zeros(len(id_to_doc), dtype=np.float64)
+ 
+            for ids in ranked.lists:
+                if len(ids):
+                    np.add.at(scores, ids, rrf_lut[:len(ids)])
+ 
+        if top_k is not None and top_k < len(id_to_doc):
+            # Partial selection is O(M log K); nlargest keeps first-seen order among ties
+            order = heapq.nlargest(top_k, range(len(id_to_doc)), key=scores.__getitem__)
+        else:
+            # Stable sort keeps first-seen order among equal scores
+            order = np.argsort(-scores, kind="stable")
+        reranked_results = [id_to_doc[i] for i in order]
  
         return reranked_results
- 
\ No newline at end of file
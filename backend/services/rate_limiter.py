@@ -4,13 +4,67 @@ Enhanced rate limiting and batching strategy for Microsoft Graph API.
 This module provides configurable rate limiting to handle large OneNote syncs
 without hitting API limits.
 """
+import os
 import time
+import random
 import logging
-from typing import Optional
+import itertools
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
 from datetime import datetime, timedelta
  
 logger = logging.getLogger(__name__)
  
+# Optional shared token bucket for multi-worker deployments (pip install redis)
+try:
+    import redis
+    _REDIS_AVAILABLE = True
+except ImportError:
+    _REDIS_AVAILABLE = False
+ 
+# Backoff bounds for repeated 429 responses
+MAX_BACKOFF_SECONDS = 60
+MAX_BACKOFF_EXPONENT = 6
+ 
+# Reported quota below which the adaptive limiter slows down pre-emptively:
+# a fraction of the quota when the limit is known, else a request count
+LOW_QUOTA_FRACTION = 0.1
+LOW_QUOTA_REQUESTS = 10
+# Low-quota slowdowns are applied at most once per rate window
+QUOTA_SLOWDOWN_INTERVAL_SECONDS = 60
+ 
+# Token counts are kept in millionths of a token so accounting stays exact
+MICRO = 1_000_000
+ 
+# Atomic token bucket shared by all workers, timed by the Redis server clock.
+# KEYS[1] = bucket hash; ARGV = requested tokens, capacity, tokens per second.
+# Returns {allowed, retry_after_ms}.
+_TOKEN_BUCKET_LUA = """
+local requested = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local needed = math.min(requested, capacity)
+local allowed = 0
+local retry_after = 0
+if tokens >= needed then
+    tokens = tokens - requested
+    allowed = 1
+else
+    retry_after = math.ceil((needed - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 2000 / rate))
+return {allowed, retry_after}
+"""
+ 
  
 class RateLimiter:
     """
@@ -26,6 +80,13 @@ class RateLimiter:
     - Configurable delays for different operations
     """
    
+    __slots__ = (
+        "_requests_per_minute", "_us_per_token", "burst_size", "min_interval",
+        "_min_interval_us", "_tokens_micro", "max_tokens", "_max_tokens_micro",
+        "_last_refill_us", "_last_request_us", "_lock", "_cancel_event",
+        "consecutive_rate_limits", "total_requests", "total_waits", "total_wait_time"
+    )
+   
     def __init__(
         self,
         requests_per_minute: int = 100,
@@ -43,11 +104,19 @@ class RateLimiter:
         self.requests_per_minute = requests_per_minute
         self.burst_size = burst_size
         self.min_interval = min_interval_ms / 1000.0  # Convert to seconds
+        self._min_interval_us = min_interval_ms * 1000
        
-        self.tokens = burst_size
+        self._tokens_micro = burst_size * MICRO
         self.max_tokens = burst_size
-        self.last_refill = time.time()
-        self.last_request = 0
+        self._max_tokens_micro = burst_size * MICRO
+        # Integer microseconds from the monotonic clock, so wall-clock
+        # adjustments never skew waits
+        self._last_refill_us = time.monotonic_ns() // 1000
+        self._last_request_us = self._last_refill_us - self._min_interval_us
+        self._lock = threading.Lock()
+        # Set by close() to wake any waiter and refuse further requests
+        self._cancel_event = threading.Event()
+        self.consecutive_rate_limits = 0
        
         # Statistics
         self.total_requests = 0
@@ -59,17 +128,43 @@ class RateLimiter:
             f"burst={burst_size}, min_interval={min_interval_ms}ms"
         )
    
-    def _refill_tokens(self):
-        """Refill tokens based on time elapsed."""
-        now = time.time()
-        elapsed = now - self.last_refill
+    @property
+    def requests_per_minute(self) -> float:
+        """Current request rate; setting it also updates the refill step."""
+        return self._requests_per_minute
+   
+    @requests_per_minute.setter
+    def requests_per_minute(self, value: float):
+        self._requests_per_minute = value
+        # Microseconds needed to earn one whole token
+        self._us_per_token = max(1, int(60_000_000 // value))
+   
+    @property
+    def tokens(self) -> float:
+        """Tokens currently in the bucket."""
+        return self._tokens_micro / MICRO
+   
+    @tokens.setter
+    def tokens(self, value: float):
+        self._tokens_micro = int(value * MICRO)
+   
+    def _refill_tokens(self, now_us: Optional[int] = None):
+        """
+        Refill tokens based on time elapsed.
        
-        # Add tokens based on time elapsed
-        # tokens_per_second = requests_per_minute / 60
-        tokens_to_add = elapsed * (self.requests_per_minute / 60.0)
+        Args:
+            now_us: Current monotonic time in microseconds (read from the clock if not given)
+        """
+        if now_us is None:
+            now_us = time.monotonic_ns() // 1000
+        elapsed_us = now_us - self._last_refill_us
        
-        self.tokens = min(self.max_tokens, self.tokens + tokens_to_add)
-        self.last_refill = now
+        # Add tokens based on time elapsed, one token per _us_per_token
+        self._tokens_micro = min(
+            self._max_tokens_micro,
+            self._tokens_micro + elapsed_us * MICRO // self._us_per_token
+        )
+        self._last_refill_us = now_us
    
     def acquire(self, wait: bool = True) -> bool:
         """
@@ -79,67 +174,112 @@ class RateLimiter:
             wait: If True, block until token available. If False, return immediately.
            
         Returns:
-            True if request can proceed, False if would need to wait (only when wait=False)
+            True if request can proceed, False if would need to wait (only when
+            wait=False) or the limiter was closed
         """
-        self._refill_tokens()
+        return self.acquire_many(1, wait=wait)
+   
+    def acquire_many(self, n: int, wait: bool = True) -> bool:
+        """
+        Acquire permission for a batch of requests with at most one wait.
        
-        # Check minimum interval
-        now = time.time()
-        time_since_last = now - self.last_request
+        The batch is granted as a whole: its requests may be issued back to
+        back, and any tokens beyond the bucket size are paid back by later
+        acquires.
        
-        if time_since_last < self.min_interval:
-            wait_time = self.min_interval - time_since_last
-            if not wait:
-                return False
+        Args:
+            n: Number of requests in the batch
+            wait: If True, block until tokens available. If False, return immediately.
            
-            logger.debug(f"Enforcing minimum interval: waiting {wait_time:.3f}s")
-            time.sleep(wait_time)
-            self.total_waits += 1
-            self.total_wait_time += wait_time
+        Returns:
+            True if requests can proceed, False if would need to wait (only when
+            wait=False) or the limiter was closed
+        """
+        if self._cancel_event.is_set():
+            return False
+        if n <= 0:
+            return True
        
-        # Check tokens
-        if self.tokens < 1:
-            if not wait:
-                return False
+        # Hold the lock through any wait so concurrent callers queue in order
+        with self._lock:
+            now_us = time.monotonic_ns() // 1000
+            self._refill_tokens(now_us)
            
-            # Calculate wait time until next token
-            wait_time = (1.0 - self.tokens) / (self.requests_per_minute / 60.0)
-            logger.debug(f"Token bucket empty: waiting {wait_time:.3f}s")
-            time.sleep(wait_time)
-            self.total_waits += 1
-            self.total_wait_time += wait_time
-            self._refill_tokens()
-       
-        # Consume token
-        self.tokens -= 1
-        self.last_request = time.time()
-        self.total_requests += 1
+            # Earliest time allowed by the minimum interval
+            deadline_us = self._last_request_us + self._min_interval_us
+           
+            # ...and by the token bucket, when it cannot cover the batch
+            missing_micro = n * MICRO - self._tokens_micro
+            if missing_micro > 0:
+                # Round up so the bucket is always covered once the wait ends
+                token_ready_us = now_us - (-missing_micro * self._us_per_token // MICRO)
+                deadline_us = max(deadline_us, token_ready_us)
+           
+            # Coalesce both constraints into a single sleep
+            wait_time = (deadline_us - now_us) / MICRO
+            if wait_time > 0:
+                if not wait:
+                    return False
+               
+                logger.debug(f"Throttling request: waiting {wait_time:.3f}s")
+                if self._cancel_event.wait(wait_time):
+                    return False
+                self.total_waits += 1
+                self.total_wait_time += wait_time
+               
+                now_us = time.monotonic_ns() // 1000
+                self._refill_tokens(now_us)
+           
+            # Consume tokens
+            self._tokens_micro -= n * MICRO
+            self._last_request_us = now_us
+            self.total_requests += n
        
         return True
    
-    def handle_rate_limit_error(self, retry_after: Optional[int] = None):
+    def handle_rate_limit_error(self, retry_after: Optional[int] = None) -> bool:
         """
         Handle 429 Too Many Requests error.
        
+        Waits with exponential backoff and random jitter over consecutive
+        429s so that retries spread out instead of clustering, while never
+        waiting less than the server's Retry-After.
+       
         Args:
             retry_after: Seconds to wait from Retry-After header (if available)
+           
+        Returns:
+            True once the backoff has elapsed, False if the limiter was closed
         """
-        wait_time = retry_after if retry_after else 60
+        base = retry_after if retry_after else 1
+        backoff = random.uniform(base, base * 2 ** self.consecutive_rate_limits)
+        wait_time = max(base, min(MAX_BACKOFF_SECONDS, backoff))
+        self.consecutive_rate_limits = min(self.consecutive_rate_limits + 1, MAX_BACKOFF_EXPONENT)
        
         logger.warning(
-            f"Rate limit hit (429). Waiting {wait_time}s as requested by server."
+            f"Rate limit hit (429). Backing off {wait_time:.1f}s "
+            f"(Retry-After: {retry_after}, consecutive: {self.consecutive_rate_limits})"
         )
        
-        # Reset tokens to 0 to prevent immediate retry
-        self.tokens = 0
-        self.last_refill = time.time()
-       
-        time.sleep(wait_time)
+        # Holding the lock pauses every other caller until the backoff ends
+        with self._lock:
+            # Reset tokens to 0 to prevent immediate retry
+            self._tokens_micro = 0
+            self._last_refill_us = time.monotonic_ns() // 1000
+           
+            if self._cancel_event.wait(wait_time):
+                return False
+           
+            # After waiting, refill to half capacity for gradual restart
+            self._tokens_micro = self._max_tokens_micro // 2
+            self.total_waits += 1
+            self.total_wait_time += wait_time
        
-        # After waiting, refill to half capacity for gradual restart
-        self.tokens = self.max_tokens / 2
-        self.total_waits += 1
-        self.total_wait_time += wait_time
+        return True
+   
+    def close(self):
+        """Wake any waiting caller and make further acquires return False."""
+        self._cancel_event.set()
    
     def get_stats(self) -> dict:
         """Get rate limiter statistics."""
@@ -159,58 +299,101 @@ class BatchProcessor:
     Processes large lists in batches with progress reporting.
     """
    
-    def __init__(self, batch_size: int = 20, show_progress: bool = True):
+    __slots__ = ("batch_size", "show_progress", "rate_limiter", "max_concurrency")
+   
+    def __init__(
+        self,
+        batch_size: int = 20,
+        show_progress: bool = True,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_concurrency: int = 1
+    ):
         """
         Initialize batch processor.
        
         Args:
             batch_size: Number of items to process per batch
             show_progress: Whether to log progress
+            rate_limiter: If given, tokens for each batch are acquired in one call,
+                so process_func must not acquire its own
+            max_concurrency: Number of items of a batch processed in parallel threads
         """
         self.batch_size = batch_size
         self.show_progress = show_progress
+        self.rate_limiter = rate_limiter
+        self.max_concurrency = max(1, max_concurrency)
    
-    def process_in_batches(self, items: list, process_func, description: str = "items"):
+    def process_in_batches(self, items: Iterable, process_func, description: str = "items"):
         """
         Process items in batches.
        
+        Items are pulled lazily, so a generator (e.g. paginated API results)
+        starts processing before it is exhausted.
+       
         Args:
-            items: List of items to process
+            items: Iterable of items to process
             process_func: Function to call for each item (receives item, returns result)
             description: Description for logging
            
         Returns:
             List of results from process_func
         """
-        total = len(items)
-        results = []
-       
-        if total == 0:
-            return results
+        # Totals are only known for sized inputs; generators report "?"
+        total = operator.length_hint(items)
        
+        # Preallocate for the expected total; unused slots are trimmed at the end
+        results = [None] * total
+        result_count = 0
         num_batches = (total + self.batch_size - 1) // self.batch_size
+        total_label = total or "?"
+        batches_label = num_batches or "?"
        
-        if self.show_progress:
-            logger.info(f"Processing {total} {description} in {num_batches} batches")
+        # Log progress roughly every 10% of batches; the rest go to DEBUG
+        log_progress = self.show_progress and logger.isEnabledFor(logging.INFO)
+        progress_every = max(1, num_batches // 10)
        
-        for batch_num in range(num_batches):
-            start_idx = batch_num * self.batch_size
-            end_idx = min(start_idx + self.batch_size, total)
-            batch = items[start_idx:end_idx]
+        if log_progress and total:
+            logger.info("Processing %d %s in %d batches", total, description, num_batches)
+       
+        item_iter = iter(items)
+        processed = 0
+        for batch_num in itertools.count():
+            batch = list(itertools.islice(item_iter, self.batch_size))
+            if not batch:
+                break
+           
+            start_idx = processed
+            processed += len(batch)
            
-            if self.show_progress:
+            if log_progress and batch_num % progress_every == 0:
                 logger.info(
-                    f"Batch {batch_num + 1}/{num_batches}: "
-                    f"Processing {description} {start_idx + 1}-{end_idx} of {total}"
+                    "Batch %d/%s: Processing %s %d-%d of %s",
+                    batch_num + 1, batches_label, description, start_idx + 1, processed, total_label
                 )
+            else:
+                logger.debug("Batch %d/%s", batch_num + 1, batches_label)
+           
+            if self.rate_limiter and not self.rate_limiter.acquire_many(len(batch)):
+                logger.warning(f"Rate limiter closed; stopping after {result_count} {description}")
+                break
            
-            for item in batch:
-                result = process_func(item)
-                if result is not None:
-                    results.append(result)
+            if self.max_concurrency > 1:
+                # Overlap the network latency of items within the batch
+                with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                    batch_results = list(executor.map(process_func, batch))
+            else:
+                batch_results = [process_func(item) for item in batch]
+           
+            # Slice assignment fills preallocated slots and grows past them if
+            # the length hint was short
+            kept = [result for result in batch_results if result is not None]
+            results[result_count:result_count + len(kept)] = kept
+            result_count += len(kept)
+       
+        del results[result_count:]
        
-        if self.show_progress:
-            logger.info(f"Completed processing {len(results)}/{total} {description}")
+        if log_progress and processed:
+            logger.info("Completed processing %d/%d %s", result_count, processed, description)
        
         return results
  
@@ -222,17 +405,21 @@ class AdaptiveRateLimiter(RateLimiter):
     Automatically slows down if seeing errors, speeds up if successful.
     """
    
+    __slots__ = ("consecutive_successes", "consecutive_errors", "original_rpm", "_last_quota_cut_us")
+   
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
        
         self.consecutive_successes = 0
         self.consecutive_errors = 0
         self.original_rpm = self.requests_per_minute
+        self._last_quota_cut_us: Optional[int] = None
    
     def record_success(self):
         """Record a successful API call."""
         self.consecutive_successes += 1
         self.consecutive_errors = 0
+        self.consecutive_rate_limits = 0
        
         # After 50 consecutive successes, try to speed up slightly
         if self.consecutive_successes >= 50:
@@ -272,4 +459,145 @@ class AdaptiveRateLimiter(RateLimiter):
                 f"Multiple errors detected. Slowing down: {old_rpm:.0f} → {self.requests_per_minute:.0f} req/min"
             )
             self.consecutive_errors = 0
+   
+    def record_quota(self, remaining: int, limit: Optional[int] = None):
+        """
+        Record the request quota the API reports as left in the current window.
+       
+        Slows down while the quota is nearly used up, so requests are paced
+        before the API starts answering 429. The rate is cut at most once per
+        QUOTA_SLOWDOWN_INTERVAL_SECONDS, so a burst of low-quota responses
+        from one window counts as a single signal.
+       
+        Args:
+            remaining: Requests left in the current window
+            limit: Total requests allowed in the window, if reported
+        """
+        threshold = limit * LOW_QUOTA_FRACTION if limit else LOW_QUOTA_REQUESTS
+        if remaining >= threshold:
+            return
+       
+        self.consecutive_successes = 0
+        with self._lock:
+            if remaining <= 0:
+                # Quota exhausted: make the next caller wait for a fresh token
+                self._tokens_micro = 0
+           
+            now_us = time.monotonic_ns() // 1000
+            if (self._last_quota_cut_us is not None
+                    and now_us - self._last_quota_cut_us < QUOTA_SLOWDOWN_INTERVAL_SECONDS * 1_000_000):
+                return
+            self._last_quota_cut_us = now_us
+            old_rpm = self.requests_per_minute
+            self.requests_per_minute = max(30, self.requests_per_minute * 0.8)
+            new_rpm = self.requests_per_minute
+       
+        if new_rpm != old_rpm:
+            logger.info(
+                f"API quota low ({remaining} left). Slowing down: "
+                f"{old_rpm:.0f} → {new_rpm:.0f} req/min"
+            )
+ 
+ 
+class RedisRateLimiter(AdaptiveRateLimiter):
+    """
+    Adaptive rate limiter whose token bucket lives in Redis.
+   
+    Every worker process shares one bucket, so N workers together stay
+    within the configured requests per minute instead of N times it. The
+    minimum interval is still enforced per process. After a denial the
+    retry time is remembered locally, so callers waiting out a throttle do
+    not query Redis again until it has passed.
+    """
+   
+    __slots__ = ("_redis", "_script", "_bucket_key", "_deny_until_us")
+   
+    def __init__(self, redis_url: str, bucket_key: str = "onenote-rag:graph-rate-limit", **kwargs):
+        """
+        Initialize Redis-backed rate limiter.
+       
+        Args:
+            redis_url: Redis connection URL (e.g. redis://localhost:6379/0)
+            bucket_key: Redis key holding the shared bucket
+            **kwargs: Passed to RateLimiter
+        """
+        super().__init__(**kwargs)
+        self._redis = redis.Redis.from_url(redis_url)
+        self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+        self._bucket_key = bucket_key
+        self._deny_until_us = 0
+   
+    def acquire_many(self, n: int, wait: bool = True) -> bool:
+        """
+        Acquire permission for a batch of requests from the shared bucket.
+       
+        Falls back to the in-process bucket if Redis cannot be reached.
+       
+        Args:
+            n: Number of requests in the batch
+            wait: If True, block until tokens available. If False, return immediately.
+           
+        Returns:
+            True if requests can proceed, False if would need to wait (only when
+            wait=False) or the limiter was closed
+        """
+        if self._cancel_event.is_set():
+            return False
+        if n <= 0:
+            return True
+       
+        with self._lock:
+            while True:
+                now_us = time.monotonic_ns() // 1000
+               
+                # Only ask Redis once the known denial and minimum interval have passed
+                deadline_us = max(self._deny_until_us, self._last_request_us + self._min_interval_us)
+                if deadline_us <= now_us:
+                    try:
+                        allowed, retry_after_ms = self._script(
+                            keys=[self._bucket_key],
+                            args=[n, self.max_tokens, self.requests_per_minute / 60.0]
+                        )
+                    except redis.RedisError as e:
+                        logger.warning(f"Redis rate limiter unavailable, using local limits: {e}")
+                        break
+                    if allowed:
+                        self._last_request_us = now_us
+                        self.total_requests += n
+                        return True
+                    deadline_us = now_us + retry_after_ms * 1000
+                    self._deny_until_us = deadline_us
+               
+                if not wait:
+                    return False
+               
+                wait_time = (deadline_us - now_us) / MICRO
+                logger.debug(f"Throttling request: waiting {wait_time:.3f}s")
+                if self._cancel_event.wait(wait_time):
+                    return False
+                self.total_waits += 1
+                self.total_wait_time += wait_time
+       
+        return super().acquire_many(n, wait=wait)
+ 
+ 
+def create_rate_limiter(**kwargs) -> AdaptiveRateLimiter:
+    """
+    Create the rate limiter for Graph API calls.
+   
+    Uses a Redis-shared bucket when REDIS_URL is set, otherwise a
+    per-process one.
+   
+    Args:
+        **kwargs: Passed to RateLimiter
+   
+    Returns:
+        RedisRateLimiter or AdaptiveRateLimiter instance
+    """
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        if _REDIS_AVAILABLE:
+            return RedisRateLimiter(redis_url=redis_url, **kwargs)
+        logger.warning("REDIS_URL is set but redis is not installed; using a per-process rate limiter")
+    return AdaptiveRateLimiter(**kwargs)
  
\ No newline at end of file
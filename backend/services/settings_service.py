@@ -3,25 +3,85 @@ Settings management service with encryption support.
 """
 import logging
 import os
-from typing import Optional, List, Dict, Any
+import time
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Mapping, Tuple
 from .database import DatabaseService
 from .encryption import EncryptionService
 
 logger = logging.getLogger(__name__)
 
 
+# Seconds a bulk settings read is reused across calls
+SETTINGS_CACHE_TTL = 1.0
+
+# Number of decrypted ciphertexts kept in memory
+DECRYPT_CACHE_SIZE = 64
+
 # Settings that should be encrypted
-SENSITIVE_KEYS = {
+SENSITIVE_KEYS = frozenset({
     "openai_api_key",
     "langchain_api_key",
     "microsoft_client_secret",
     "microsoft_graph_token"
-}
+})
+
+_DefaultSetting = namedtuple("_DefaultSetting", ["description", "is_sensitive"])
+
+# All expected settings with descriptions (built once, read-only)
+_ALL_DEFAULTS: Mapping[str, _DefaultSetting] = MappingProxyType({
+    "openai_api_key": _DefaultSetting("OpenAI API key for embeddings and LLM", True),
+    "langchain_api_key": _DefaultSetting("LangChain/LangSmith API key for tracing", True),
+    "langchain_project": _DefaultSetting("LangSmith project name", False),
+    "langchain_tracing_v2": _DefaultSetting("Enable LangSmith tracing (true/false)", False),
+    "microsoft_client_id": _DefaultSetting("Microsoft Azure AD Client ID", False),
+    "microsoft_client_secret": _DefaultSetting("Microsoft Azure AD Client Secret", True),
+    "microsoft_tenant_id": _DefaultSetting("Microsoft Azure AD Tenant ID", False),
+    "microsoft_graph_token": _DefaultSetting("Microsoft Graph API Bearer Token (optional)", True),
+    "use_azure_ad_auth": _DefaultSetting("Use Azure AD authentication (true) or Manual Token (false)", False),
+    "chunk_size": _DefaultSetting("Document chunk size for processing", False),
+    "chunk_overlap": _DefaultSetting("Overlap between document chunks", False),
+    "enable_startup_sync": _DefaultSetting("Auto-sync OneNote on startup (true/false)", False),
+    "embedding_provider": _DefaultSetting("Embedding provider (openai)", False)
+})
+
+# Parallel per-setting columns, aligned by index, for the get_all_settings loop
+_KEYS = tuple(_ALL_DEFAULTS)
+_DESCRIPTIONS = tuple(default.description for default in _ALL_DEFAULTS.values())
+_IS_SENSITIVE = tuple(key in SENSITIVE_KEYS for key in _KEYS)
+
+# Environment variable name for each known setting
+_ENV_KEY_UPPER: Mapping[str, str] = MappingProxyType({key: key.upper() for key in _ALL_DEFAULTS})
+
+# Memoized environment lookups; cleared by SettingsService.refresh_env()
+_ENV_CACHE: Dict[str, Optional[str]] = {}
+_SENTINEL = object()
+
+
+def _env(key: str) -> Optional[str]:
+    """
+    Get the environment variable backing a setting, memoized per process.
+
+    Args:
+        key: Setting key
+
+    Returns:
+        Environment variable value or None if unset
+    """
+    value = _ENV_CACHE.get(key, _SENTINEL)
+    if value is _SENTINEL:
+        value = os.environ.get(_ENV_KEY_UPPER.get(key) or key.upper())
+        _ENV_CACHE[key] = value
+    return value
 
 
 class SettingsService:
     """Service for managing application settings with encryption."""
 
+    __slots__ = ("db", "encryption", "_decrypt_cached", "_settings_cache")
+
     def __init__(
         self,
         db_service: DatabaseService,
@@ -36,92 +96,67 @@ class SettingsService:
         """
         self.db = db_service
         self.encryption = encryption_service
+        # Fernet ciphertexts are unique per encryption, so a cache keyed on the
+        # ciphertext can never return a stale value
+        self._decrypt_cached = lru_cache(maxsize=DECRYPT_CACHE_SIZE)(self.encryption.decrypt)
+        # (monotonic fetch time, settings rows by key)
+        self._settings_cache: Tuple[float, Dict[str, Dict[str, Any]]] = (float("-inf"), {})
         self._initialize_default_settings()
 
+    def _load_settings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get all settings rows keyed by setting key, with one DB query per TTL window.
+
+        Returns:
+            Dictionary of setting key to raw (still encrypted) setting row
+        """
+        fetched_at, settings = self._settings_cache
+        if time.monotonic() - fetched_at < SETTINGS_CACHE_TTL:
+            return settings
+
+        settings = {s["key"]: s for s in self.db.get_all_settings()}
+        self._settings_cache = (time.monotonic(), settings)
+        return settings
+
+    def _invalidate_settings_cache(self) -> None:
+        """Force the next read to query the database."""
+        self._settings_cache = (float("-inf"), {})
+
     def _initialize_default_settings(self) -> None:
         """Initialize default settings with descriptions."""
-        defaults = [
-            {
-                "key": "openai_api_key",
-                "description": "OpenAI API key for embeddings and LLM",
-                "is_sensitive": True
-            },
-            {
-                "key": "langchain_api_key",
-                "description": "LangChain/LangSmith API key for tracing",
-                "is_sensitive": True
-            },
-            {
-                "key": "langchain_project",
-                "description": "LangSmith project name",
-                "is_sensitive": False
-            },
-            {
-                "key": "langchain_tracing_v2",
-                "description": "Enable LangSmith tracing (true/false)",
-                "is_sensitive": False
-            },
-            {
-                "key": "microsoft_client_id",
-                "description": "Microsoft Azure AD Client ID",
-                "is_sensitive": False
-            },
-            {
-                "key": "microsoft_client_secret",
-                "description": "Microsoft Azure AD Client Secret",
-                "is_sensitive": True
-            },
-            {
-                "key": "microsoft_tenant_id",
-                "description": "Microsoft Azure AD Tenant ID",
-                "is_sensitive": False
-            },
-            {
-                "key": "microsoft_graph_token",
-                "description": "Microsoft Graph API Bearer Token (optional)",
-                "is_sensitive": True
-            },
-            {
-                "key": "use_azure_ad_auth",
-                "description": "Use Azure AD authentication (true) or Manual Token (false)",
-                "is_sensitive": False
-            },
-            {
-                "key": "chunk_size",
-                "description": "Document chunk size for processing",
-                "is_sensitive": False
-            },
-            {
-                "key": "chunk_overlap",
-                "description": "Overlap between document chunks",
-                "is_sensitive": False
-            },
-            {
-                "key": "enable_startup_sync",
-                "description": "Auto-sync OneNote on startup (true/false)",
-                "is_sensitive": False
-            },
-            {
-                "key": "embedding_provider",
-                "description": "Embedding provider (openai)",
-                "is_sensitive": False
-            }
-        ]
+        # Fetch existing keys in one query
+        existing_keys = {s["key"] for s in self.db.get_all_settings()}
 
         # Only create if they don't exist (don't overwrite existing values)
-        for default in defaults:
-            existing = self.db.get_setting(default["key"])
-            if not existing:
-                # Check if value exists in environment variables
-                env_value = os.getenv(default["key"].upper())
-                if env_value:
-                    # Migrate from .env to database
-                    self.set_setting(
-                        key=default["key"],
-                        value=env_value,
-                        description=default.get("description")
-                    )
-                    logger.info(f"Migrated {default['key']} from .env to database")
+        migrations = []
+        for key, default_info in _ALL_DEFAULTS.items():
+            if key in existing_keys:
+                continue
+
+            # Check if value exists in environment variables
+            env_value = _env(key)
+            if env_value:
+                # Migrate from .env to database
+                migrations.append((key, env_value, key in SENSITIVE_KEYS, default_info.description))
+
+        # Encrypt all sensitive values in one batch
+        encrypted_values = iter(self.encryption.encrypt_batch(
+            [value for _, value, is_sensitive, _ in migrations if is_sensitive]
+        ))
+        migrations = [
+            (key, next(encrypted_values) if is_sensitive else value, is_sensitive, description)
+            for key, value, is_sensitive, description in migrations
+        ]
+
+        # Write all migrated values in a single transaction
+        self.db.set_settings_bulk(migrations)
+        for key, _, _, _ in migrations:
+            logger.info(f"Migrated {key} from .env to database")
+
+    @staticmethod
+    def refresh_env() -> None:
+        """Drop memoized environment lookups; call after changing os.environ."""
+        _ENV_CACHE.clear()
 
     def get_setting(self, key: str, decrypt: bool = True) -> Optional[str]:
         """
@@ -137,14 +172,14 @@ class SettingsService:
         setting = self.db.get_setting(key)
         if not setting:
             # Fallback to environment variable
-            return os.getenv(key.upper())
+            return _env(key)
 
         value = setting["value"]
 
         # Decrypt if sensitive and requested
         if decrypt and key in SENSITIVE_KEYS and value:
             try:
-                value = self.encryption.decrypt(value)
+                value = self._decrypt_cached(value)
             except Exception as e:
                 logger.error(f"Failed to decrypt {key}: {str(e)}")
                 return None
@@ -161,56 +196,73 @@ class SettingsService:
         Returns:
             List of settings with values (includes all defaults even if not in DB)
         """
-        # Define all expected settings with descriptions
-        all_defaults = {
-            "openai_api_key": {"description": "OpenAI API key for embeddings and LLM", "is_sensitive": True},
-            "langchain_api_key": {"description": "LangChain/LangSmith API key for tracing", "is_sensitive": True},
-            "langchain_project": {"description": "LangSmith project name", "is_sensitive": False},
-            "langchain_tracing_v2": {"description": "Enable LangSmith tracing (true/false)", "is_sensitive": False},
-            "microsoft_client_id": {"description": "Microsoft Azure AD Client ID", "is_sensitive": False},
-            "microsoft_client_secret": {"description": "Microsoft Azure AD Client Secret", "is_sensitive": True},
-            "microsoft_tenant_id": {"description": "Microsoft Azure AD Tenant ID", "is_sensitive": False},
-            "microsoft_graph_token": {"description": "Microsoft Graph API Bearer Token (optional)", "is_sensitive": True},
-            "use_azure_ad_auth": {"description": "Use Azure AD authentication (true) or Manual Token (false)", "is_sensitive": False},
-            "chunk_size": {"description": "Document chunk size for processing", "is_sensitive": False},
-            "chunk_overlap": {"description": "Overlap between document chunks", "is_sensitive": False},
-            "enable_startup_sync": {"description": "Auto-sync OneNote on startup (true/false)", "is_sensitive": False},
-            "embedding_provider": {"description": "Embedding provider (openai)", "is_sensitive": False}
-        }
-        
-        # Get existing settings from database
-        db_settings = {s["key"]: s for s in self.db.get_all_settings()}
+        if mask_sensitive:
+            return self._get_all_masked()
+        return self._get_all_unmasked()
+
+    def _get_all_masked(self) -> List[Dict[str, Any]]:
+        """
+        Get all settings with sensitive values masked, without decrypting.
+
+        Returns:
+            List of settings with values (includes all defaults even if not in DB)
+        """
+        db_settings = self._load_settings()
+        result = []
+
+        for key, default_description, is_sensitive in zip(_KEYS, _DESCRIPTIONS, _IS_SENSITIVE):
+            db_setting = db_settings.get(key)
+
+            if db_setting is not None:
+                value = db_setting["value"]
+                description = db_setting.get("description") or default_description
+            else:
+                # Setting not in DB, check environment variable
+                value = _env(key) or ""
+                description = default_description
+
+            has_value = bool(value)
+            if is_sensitive:
+                value = "********" if has_value else ""
+
+            result.append({
+                "key": key,
+                "value": value,
+                "is_sensitive": is_sensitive,
+                "description": description,
+                "has_value": has_value
+            })
+
+        return result
+
+    def _get_all_unmasked(self) -> List[Dict[str, Any]]:
+        """
+        Get all settings with sensitive values decrypted.
+
+        Returns:
+            List of settings with values (includes all defaults even if not in DB)
+        """
+        db_settings = self._load_settings()
         result = []
 
-        # Process all default settings
-        for key, default_info in all_defaults.items():
-            is_sensitive = key in SENSITIVE_KEYS
-            
-            # Check if setting exists in database
-            if key in db_settings:
-                db_setting = db_settings[key]
+        for key, default_description, is_sensitive in zip(_KEYS, _DESCRIPTIONS, _IS_SENSITIVE):
+            db_setting = db_settings.get(key)
+
+            if db_setting is not None:
                 value = db_setting["value"]
-                description = db_setting.get("description") or default_info["description"]
+                description = db_setting.get("description") or default_description
                 has_value = bool(value)
-                
-                # Mask or decrypt sensitive values
-                if mask_sensitive and is_sensitive:
-                    value = "********" if has_value else ""
-                elif is_sensitive and value:
+
+                if is_sensitive and value:
                     try:
-                        value = self.encryption.decrypt(value)
+                        value = self._decrypt_cached(value)
                     except Exception:
                         value = ""
             else:
                 # Setting not in DB, check environment variable
-                env_value = os.getenv(key.upper())
-                value = env_value or ""
-                description = default_info["description"]
-                has_value = bool(env_value)
-                
-                # Mask sensitive env values
-                if mask_sensitive and is_sensitive and has_value:
-                    value = "********"
+                value = _env(key) or ""
+                description = default_description
+                has_value = bool(value)
 
             result.append({
                 "key": key,
@@ -244,13 +296,17 @@ class SettingsService:
         # Encrypt sensitive values
         if is_sensitive and value:
             value = self.encryption.encrypt(value)
+            # Drop plaintexts of replaced values
+            self._decrypt_cached.cache_clear()
 
-        return self.db.set_setting(
+        setting = self.db.set_setting(
             key=key,
             value=value,
             is_sensitive=is_sensitive,
             description=description
         )
+        self._invalidate_settings_cache()
+        return setting
 
     def delete_setting(self, key: str) -> bool:
         """
@@ -262,7 +318,10 @@ class SettingsService:
         Returns:
             True if deleted
         """
-        return self.db.delete_setting(key)
+        self._decrypt_cached.cache_clear()
+        deleted = self.db.delete_setting(key)
+        self._invalidate_settings_cache()
+        return deleted
 
     def get_settings_dict(self) -> Dict[str, str]:
         """
@@ -271,17 +330,15 @@ class SettingsService:
         Returns:
             Dictionary of key-value pairs
         """
-        settings = self.db.get_all_settings()
         result = {}
 
-        for setting in settings:
-            key = setting["key"]
+        for key, setting in self._load_settings().items():
             value = setting["value"]
 
             # Decrypt sensitive values
             if key in SENSITIVE_KEYS and value:
                 try:
-                    value = self.encryption.decrypt(value)
+                    value = self._decrypt_cached(value)
                 except Exception:
                     continue
 
@@ -1,9 +1,13 @@
 """
 Vector store service using ChromaDB.
 """
+import heapq
 import logging
+import sys
+import uuid
+from collections import Counter
 import httpx
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import chromadb
 from chromadb.config import Settings
 from langchain_openai import OpenAIEmbeddings
@@ -12,6 +16,9 @@ from langchain_core.documents import Document
  
 logger = logging.getLogger(__name__)
  
+# Chunks embedded per embeddings request when adding documents
+EMBED_BATCH_SIZE = 256
+ 
  
 class VectorStoreService:
     """Service for managing vector database operations."""
@@ -70,7 +77,25 @@ class VectorStoreService:
             return
  
         try:
-            self.vectorstore.add_documents(documents)
+            # Embed each batch with one request, rather than letting Chroma
+            # embed per add call
+            texts = [doc.page_content for doc in documents]
+            embeddings = []
+            for start in range(0, len(texts), EMBED_BATCH_SIZE):
+                embeddings.extend(self.embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+ 
+            # Write everything in as few add calls (and SQLite transactions)
+            # as Chroma allows
+            collection = self.vectorstore._collection
+            write_batch_size = self.vectorstore._client.get_max_batch_size()
+            for start in range(0, len(documents), write_batch_size):
+                end = start + write_batch_size
+                collection.add(
+                    ids=[str(uuid.uuid4()) for _ in documents[start:end]],
+                    embeddings=embeddings[start:end],
+                    metadatas=[doc.metadata for doc in documents[start:end]],
+                    documents=texts[start:end]
+                )
             logger.info(f"Added {len(documents)} documents to vector store")
  
             # Log sample for verification
@@ -172,20 +197,84 @@ class VectorStoreService:
             page_id: OneNote page ID to delete
         """
         try:
-            collection = self.vectorstore._collection
-            # Query for documents with this page_id
-            results = collection.get(where={"page_id": page_id})
-           
-            if results and results['ids']:
-                collection.delete(ids=results['ids'])
-                logger.info(f"Deleted {len(results['ids'])} chunks for page {page_id}")
-            else:
-                logger.debug(f"No chunks found for page {page_id}")
+            # Let Chroma match and delete the page's chunks in one call
+            # instead of fetching their IDs first
+            self.vectorstore._collection.delete(where={"page_id": page_id})
+            logger.info(f"Deleted chunks for page {page_id}")
  
         except Exception as e:
             logger.error(f"Error deleting page {page_id}: {str(e)}")
             raise
  
+    def reuse_unchanged_chunks(
+        self, page_id: str, chunks: List[Document]
+    ) -> Tuple[Dict[str, Any], List[Document]]:
+        """
+        Plan replacing a page's stored chunks, keeping those whose text did not change.
+ 
+        Stored chunks with the same text as a new chunk keep their embedding and
+        only take the new chunk's metadata; stored chunks matching no new chunk
+        are to be deleted. Nothing is written here: pass the plan to
+        apply_chunk_reuse once the returned chunks have been added.
+ 
+        Args:
+            page_id: OneNote page ID
+            chunks: New chunks of the page
+ 
+        Returns:
+            Tuple of (plan, chunks that still need to be embedded and added),
+            where plan holds "page_id", "stale_ids", "kept_ids" and "kept_metadatas"
+        """
+        try:
+            collection = self.vectorstore._collection
+            results = collection.get(where={"page_id": page_id}, include=["documents"])
+ 
+            stored_ids: Dict[str, List[str]] = {}
+            for chunk_id, text in zip(results['ids'], results['documents']):
+                stored_ids.setdefault(text, []).append(chunk_id)
+ 
+            kept_ids, kept_metadatas, new_chunks = [], [], []
+            for chunk in chunks:
+                ids = stored_ids.get(chunk.page_content)
+                if ids:
+                    kept_ids.append(ids.pop())
+                    kept_metadatas.append(chunk.metadata)
+                else:
+                    new_chunks.append(chunk)
+ 
+            stale_ids = [chunk_id for ids in stored_ids.values() for chunk_id in ids]
+            logger.debug(f"Page {page_id}: keeping {len(kept_ids)} unchanged chunks, "
+                         f"deleting {len(stale_ids)}, {len(new_chunks)} to embed")
+            plan = {
+                "page_id": page_id,
+                "stale_ids": stale_ids,
+                "kept_ids": kept_ids,
+                "kept_metadatas": kept_metadatas,
+            }
+            return plan, new_chunks
+ 
+        except Exception as e:
+            logger.error(f"Error reading chunks of page {page_id}: {str(e)}")
+            raise
+ 
+    def apply_chunk_reuse(self, plan: Dict[str, Any]) -> None:
+        """
+        Delete a page's stale chunks and update its kept ones, per reuse_unchanged_chunks.
+ 
+        Args:
+            plan: Plan returned by reuse_unchanged_chunks
+        """
+        try:
+            collection = self.vectorstore._collection
+            if plan["stale_ids"]:
+                collection.delete(ids=plan["stale_ids"])
+            if plan["kept_ids"]:
+                collection.update(ids=plan["kept_ids"], metadatas=plan["kept_metadatas"])
+ 
+        except Exception as e:
+            logger.error(f"Error replacing chunks for page {plan['page_id']}: {str(e)}")
+            raise
+ 
     def get_page_modified_date(self, page_id: str) -> Optional[str]:
         """
         Get the modified date of a page from the vector store.
@@ -212,6 +301,66 @@ class VectorStoreService:
             logger.error(f"Error getting modified date for page {page_id}: {str(e)}")
             return None
  
+    def get_page_metadata(self, fields: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get selected metadata fields of every indexed page in one query.
+ 
+        Args:
+            fields: Metadata keys to return
+ 
+        Returns:
+            Dictionary of page_id to {field: value} (missing fields are None)
+        """
+        try:
+            collection = self.vectorstore._collection
+            results = collection.get(include=["metadatas"])
+ 
+            page_metadata = {}
+            for metadata in results.get("metadatas") or []:
+                page_id = metadata.get("page_id")
+                if page_id and page_id not in page_metadata:
+                    page_metadata[page_id] = {field: metadata.get(field) for field in fields}
+            return page_metadata
+ 
+        except Exception as e:
+            logger.error(f"Error getting page metadata: {str(e)}")
+            return {}
+ 
+    def get_page_modified_dates(self) -> Dict[str, str]:
+        """
+        Get the modified date of every indexed page in one query.
+ 
+        Returns:
+            Dictionary of page_id to modified date string
+        """
+        return {
+            page_id: metadata["modified_date"]
+            for page_id, metadata in self.get_page_metadata(("modified_date",)).items()
+        }
+ 
+    def update_page_metadata(self, page_id: str, updates: Dict[str, Any]) -> None:
+        """
+        Update metadata fields on all chunks of a page without re-embedding them.
+ 
+        Args:
+            page_id: OneNote page ID
+            updates: Metadata keys and new values
+        """
+        try:
+            collection = self.vectorstore._collection
+            results = collection.get(where={"page_id": page_id}, include=["metadatas"])
+ 
+            if results and results['ids']:
+                collection.update(
+                    ids=results['ids'],
+                    metadatas=[{**metadata, **updates} for metadata in results['metadatas']]
+                )
+                logger.debug(f"Updated metadata of {len(results['ids'])} chunks for page {page_id}")
+ 
+        except Exception as e:
+            logger.error(f"Error updating metadata for page {page_id}: {str(e)}")
+            raise
+ 
     def clear_collection(self) -> None:
         """Clear all documents from the collection."""
         try:
@@ -250,12 +399,16 @@ class VectorStoreService:
                 "error": str(e)
             }
  
-    def get_indexed_pages(self) -> List[Dict[str, Any]]:
+    def get_indexed_pages(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Get list of all indexed pages with their metadata.
        
+        Args:
+            limit: Optional maximum number of pages to return
+       
         Returns:
-            List of page dictionaries with metadata and chunk counts
+            List of page dictionaries with metadata and chunk counts,
+            most recently modified first
         """
         try:
             collection = self.vectorstore._collection
@@ -268,35 +421,39 @@ class VectorStoreService:
             if not results or not results['metadatas']:
                 return []
            
-            # Group by page_id and aggregate metadata
+            # Group by page_id, building each page's entry from its first chunk
             pages_dict = {}
+            chunk_counts = Counter()
             for metadata in results['metadatas']:
                 page_id = metadata.get('page_id')
                 if not page_id:
                     continue
                
+                chunk_counts[page_id] += 1
                 if page_id not in pages_dict:
+                    # Many pages share a section and notebook; keep one copy of each name
                     pages_dict[page_id] = {
                         'page_id': page_id,
                         'page_title': metadata.get('page_title', 'Untitled'),
-                        'section_name': metadata.get('section_name', 'Unknown'),
-                        'notebook_name': metadata.get('notebook_name', 'Unknown'),
+                        'section_name': sys.intern(metadata.get('section_name', 'Unknown')),
+                        'notebook_name': sys.intern(metadata.get('notebook_name', 'Unknown')),
                         'modified_date': metadata.get('modified_date'),
                         'created_date': metadata.get('created_date'),
                         'url': metadata.get('url', ''),
-                        'chunk_count': 0
                     }
-               
-                pages_dict[page_id]['chunk_count'] += 1
            
-            # Convert to list and sort by modified date (newest first)
-            pages_list = list(pages_dict.values())
-            pages_list.sort(
-                key=lambda x: x.get('modified_date', ''),
-                reverse=True
-            )
+            for page_id, page in pages_dict.items():
+                page['chunk_count'] = chunk_counts[page_id]
+           
+            # Order by modified date (newest first); pages without one go last
+            sort_key = lambda page: page['modified_date'] or ''
+            if limit is not None:
+                # Select the newest pages without sorting all of them
+                pages_list = heapq.nlargest(limit, pages_dict.values(), key=sort_key)
+            else:
+                pages_list = sorted(pages_dict.values(), key=sort_key, reverse=True)
            
-            logger.info(f"Found {len(pages_list)} indexed pages with {len(results['metadatas'])} total chunks")
+            logger.info(f"Found {len(pages_dict)} indexed pages with {len(results['metadatas'])} total chunks")
             return pages_list
            
         except Exception as e:
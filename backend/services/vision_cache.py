@@ -0,0 +1,176 @@
+"""
+SQLite cache of GPT-4o Vision responses, keyed by image content.
+
+Every method does blocking SQLite I/O; async callers run them with
+asyncio.to_thread.
+"""
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How long a cached vision response is reused before the image is analyzed again
+DEFAULT_VISION_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Keys looked up per query, below SQLite's default limit on bound parameters
+LOOKUP_BATCH_SIZE = 500
+
+
+class VisionCache:
+    """On-disk cache of image analysis results, so re-syncs skip repeat vision calls."""
+
+    def __init__(
+        self,
+        db_path: str = "./data/vision_cache.db",
+        ttl_seconds: int = DEFAULT_VISION_CACHE_TTL_SECONDS
+    ):
+        """
+        Initialize the vision cache.
+
+        Args:
+            db_path: Path to SQLite database file
+            ttl_seconds: Age after which a cached response is ignored and replaced
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._initialize_schema()
+
+    @contextmanager
+    def get_connection(self):
+        """
+        Context manager for cache database connections.
+
+        Yields:
+            sqlite3.Connection: Database connection
+        """
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _initialize_schema(self) -> None:
+        """Create the cache table if needed and drop expired entries."""
+        with self.get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS vision_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            removed = conn.execute(
+                "DELETE FROM vision_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            ).rowcount
+
+        logger.info(f"Vision cache initialized at {self.db_path} ({removed} expired entries removed)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached analysis result.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached result, or None if missing, expired or unreadable
+        """
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT value FROM vision_cache WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl_seconds)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+
+        except Exception as e:
+            logger.warning(f"Error reading vision cache: {str(e)}")
+            return None
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the cached analysis results of several keys in one query.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Dictionary of key to cached result, without missing or expired keys
+        """
+        found = {}
+        try:
+            with self.get_connection() as conn:
+                cutoff = time.time() - self.ttl_seconds
+                for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                    batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT key, value FROM vision_cache "
+                        f"WHERE key IN ({placeholders}) AND created_at >= ?",
+                        (*batch, cutoff)
+                    ).fetchall()
+                    found.update((key, json.loads(value)) for key, value in rows)
+            return found
+
+        except Exception as e:
+            logger.warning(f"Error reading vision cache: {str(e)}")
+            return found
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Cache an analysis result, replacing any previous one.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable analysis result
+        """
+        try:
+            with self.get_connection() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO vision_cache (key, value, created_at) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        value = excluded.value,
+                        created_at = excluded.created_at
+                    """,
+                    (key, json.dumps(value), time.time())
+                )
+
+        except Exception as e:
+            logger.warning(f"Error writing vision cache: {str(e)}")
+
+    def set_many(self, items: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Cache several analysis results in one transaction.
+
+        Args:
+            items: (key, JSON-serializable analysis result) pairs
+        """
+        try:
+            now = time.time()
+            with self.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO vision_cache (key, value, created_at) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        value = excluded.value,
+                        created_at = excluded.created_at
+                    """,
+                    [(key, json.dumps(value), now) for key, value in items]
+                )
+
+        except Exception as e:
+            logger.warning(f"Error writing vision cache: {str(e)}")
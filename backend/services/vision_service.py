@@ -1,14 +1,212 @@
 """
 GPT-4o Vision service for analyzing images and extracting content.
 """
+import asyncio
+import hashlib
+import json
 import logging
 import base64
-from typing import Dict, List, Optional, Literal
+import io
+import math
+from typing import AsyncIterator, Dict, List, Optional, Literal, Tuple
 import httpx
 from openai import AsyncOpenAI
 
+from .vision_cache import VisionCache
+
+# Optional SIMD base64 encoder for image payloads (pip install pybase64)
+try:
+    import pybase64
+    _PYBASE64_AVAILABLE = True
+except ImportError:
+    _PYBASE64_AVAILABLE = False
+
+# Optional image library for downscaling images and choosing the vision
+# detail level (pip install Pillow, or Pillow-SIMD for faster resizing)
+try:
+    from PIL import Image
+    _PIL_AVAILABLE = True
+except ImportError:
+    _PIL_AVAILABLE = False
+
+# Optional aiohttp transport for the OpenAI client (pip install "openai[aiohttp]")
+try:
+    import httpx_aiohttp  # noqa: F401
+    from openai import DefaultAioHttpClient
+    _AIOHTTP_AVAILABLE = True
+except ImportError:
+    _AIOHTTP_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Connection pool for vision requests; indexing fans out many at once
+VISION_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60.0)
+
+# Vision requests in flight at once per service, across all pages being synced
+DEFAULT_MAX_CONCURRENT_VISION_REQUESTS = 16
+
+# Retries of a rate-limited (429), timed-out, connection-failed or 5xx
+# vision request; the OpenAI client backs off exponentially with jitter
+# and honors Retry-After, while other errors fail at once
+VISION_MAX_RETRIES = 5
+
+# Images sent together in one analyze_images_batch request
+VISION_BATCH_SIZE = 5
+
+# Model for bulk indexing-time analysis; question answering uses gpt-4o
+INDEXING_VISION_MODEL = "gpt-4o-mini"
+
+# Largest side of an image the "fast" tier sends at low detail, which the
+# API processes as one 512px tile for a flat ~85 tokens
+LOW_DETAIL_MAX_SIDE = 512
+
+# Images are downscaled to this longest side and re-encoded as JPEG before
+# upload; larger images only cost more high-detail tiles
+MAX_VISION_IMAGE_SIDE = 1024
+VISION_JPEG_QUALITY = 80
+
+# Image input tokens allowed per question; images past the budget are
+# dropped, and those that no longer fit at high detail are sent at low
+DEFAULT_IMAGE_TOKEN_BUDGET = 8000
+
+# Images preprocessed together while selecting images for a question;
+# preprocessing stops with the batch that reaches the token budget
+PREPROCESS_BATCH_SIZE = 4
+
+# Images scoring at or below this are sent at low detail when answering
+HIGH_DETAIL_MIN_SCORE = 0.5
+
+# Token cost of an image at low detail, and the most one can cost at high
+LOW_DETAIL_IMAGE_TOKENS = 85
+MAX_HIGH_DETAIL_IMAGE_TOKENS = 1445
+
+
+def _preprocess_image(image_data: bytes) -> bytes:
+    """
+    Downscale an image to MAX_VISION_IMAGE_SIDE and re-encode it as JPEG.
+
+    Args:
+        image_data: Image data as bytes
+
+    Returns:
+        The re-encoded image, or image_data unchanged if Pillow is not
+        installed, the image cannot be read, or re-encoding would not shrink it
+    """
+    if not _PIL_AVAILABLE:
+        return image_data
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image.thumbnail((MAX_VISION_IMAGE_SIDE, MAX_VISION_IMAGE_SIDE), Image.Resampling.LANCZOS)
+            if image.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white, as screenshots are viewed
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, "JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.debug(f"Could not preprocess image, sending it as is: {str(e)}")
+        return image_data
+
+    processed = buffer.getvalue()
+    return processed if len(processed) < len(image_data) else image_data
+
+
+def _encode_image(image_data: bytes) -> str:
+    """Preprocess image bytes and base64-encode them for a data URL."""
+    return _b64encode(_preprocess_image(image_data))
+
+
+def _b64encode(image_data: bytes) -> str:
+    """Base64-encode image bytes for a data URL."""
+    if _PYBASE64_AVAILABLE:
+        return pybase64.b64encode(image_data).decode('ascii')
+    return base64.b64encode(image_data).decode('ascii')
+
+
+def _hash_image(image_data: bytes) -> str:
+    """SHA-256 hex digest of image bytes, the key of their cached analyses."""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def _encode_and_hash(image_data: bytes) -> Tuple[str, str]:
+    """Base64 encoding (after preprocessing) and SHA-256 hex digest of image bytes."""
+    return _encode_image(image_data), _hash_image(image_data)
+
+
+async def _hash_images(images: List[bytes]) -> List[str]:
+    """
+    SHA-256 hex digests of several images, computed in worker threads.
+
+    hashlib releases the GIL while hashing large buffers, so the digests are
+    computed in parallel (with OpenSSL's SHA-NI/ARMv8 SHA2 code where the CPU
+    has it) and the event loop is not blocked.
+
+    Args:
+        images: Image data as bytes
+
+    Returns:
+        One hex digest per image, in order
+    """
+    return await asyncio.gather(
+        *(asyncio.to_thread(_hash_image, image_data) for image_data in images)
+    )
+
+
+def _estimate_image_tokens(image_data: bytes, detail: str) -> int:
+    """
+    Estimate the input tokens an image costs at a vision detail level.
+
+    At high detail the API fits the image within 2048x2048, scales its
+    shortest side down to 768 and charges 170 tokens per 512px tile on top
+    of the flat 85.
+
+    Args:
+        image_data: Image data as bytes, as it will be sent
+        detail: "low" or "high"
+
+    Returns:
+        Estimated token cost, or the high-detail maximum if Pillow is not
+        installed or the image cannot be read
+    """
+    if detail == "low":
+        return LOW_DETAIL_IMAGE_TOKENS
+    if not _PIL_AVAILABLE:
+        return MAX_HIGH_DETAIL_IMAGE_TOKENS
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            width, height = image.size
+    except Exception:
+        return MAX_HIGH_DETAIL_IMAGE_TOKENS
+
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / (min(width, height) * scale))
+    tiles = math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+    return LOW_DETAIL_IMAGE_TOKENS + 170 * tiles
+
+
+def _image_detail(image_data: bytes, quality_tier: str) -> str:
+    """
+    Pick the vision detail level for an image.
+
+    Args:
+        image_data: Image data as bytes
+        quality_tier: "fast" sends small images at low detail, "high" never does
+
+    Returns:
+        "low" or "high"
+    """
+    if quality_tier != "fast" or not _PIL_AVAILABLE:
+        return "high"
+    try:
+        # Only the header is read to get the size
+        with Image.open(io.BytesIO(image_data)) as image:
+            width, height = image.size
+    except Exception:
+        return "high"
+    return "low" if max(width, height) <= LOW_DETAIL_MAX_SIDE else "high"
+
 
 class GPT4VisionService:
     """Service for analyzing images using GPT-4o and GPT-4o-mini."""
@@ -21,11 +219,11 @@ class GPT4VisionService:
 3. Key visual elements (objects, diagrams, charts, etc.)
 4. Context clues (what type of document/content this appears to be)
 
-Format your response as:
-Description: [detailed description]
-Text Content: [all text found]
-Key Elements: [comma-separated list]
-Context: [type and purpose]""",
+Respond with a JSON object with these fields:
+description: detailed description
+text_content: all text found
+key_elements: comma-separated list
+context: type and purpose""",
 
         "ocr": """Extract ALL text visible in this image.
 Provide exact transcription preserving formatting and structure where possible.
@@ -53,12 +251,35 @@ Include:
 Write in a natural, paragraph form suitable for semantic search."""
     }
 
+    # Structured output schema of the "comprehensive" task
+    COMPREHENSIVE_RESPONSE_FORMAT = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "image_analysis",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "text_content": {"type": "string"},
+                    "key_elements": {"type": "string"},
+                    "context": {"type": "string"}
+                },
+                "required": ["description", "text_content", "key_elements", "context"],
+                "additionalProperties": False
+            }
+        }
+    }
+
     def __init__(
         self,
         api_key: str,
         default_model: Literal["gpt-4o", "gpt-4o-mini"] = "gpt-4o-mini",
         max_tokens: int = 1000,
         temperature: float = 0.0,
+        cache: Optional[VisionCache] = None,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_VISION_REQUESTS,
+        image_token_budget: int = DEFAULT_IMAGE_TOKEN_BUDGET,
     ):
         """
         Initialize GPT-4o Vision service.
@@ -68,39 +289,91 @@ Write in a natural, paragraph form suitable for semantic search."""
             default_model: Default model to use (gpt-4o or gpt-4o-mini)
             max_tokens: Maximum tokens for response
             temperature: Temperature for generation (0.0 for deterministic)
+            cache: Optional cache of analysis results for predefined tasks
+            max_concurrent_requests: Maximum vision requests in flight at once
+            image_token_budget: Image input tokens allowed per question answered
         """
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            http_client=httpx.AsyncClient(verify=False)
-        )
+        # aiohttp copes better than httpx's pool with many concurrent image
+        # analyses; one client is kept for the service's lifetime
+        if _AIOHTTP_AVAILABLE:
+            http_client = DefaultAioHttpClient(verify=False, limits=VISION_HTTP_LIMITS)
+        else:
+            # HTTP/2 multiplexes concurrent requests over one connection
+            http_client = httpx.AsyncClient(verify=False, http2=True, limits=VISION_HTTP_LIMITS)
+        self.client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=VISION_MAX_RETRIES)
+        self._request_semaphore = asyncio.Semaphore(max_concurrent_requests)
         self.default_model = default_model
         self.max_tokens = max_tokens
         self.temperature = temperature
+        self.image_token_budget = image_token_budget
+        self.cache = cache
+        # Analyses answered from the cache instead of the API
+        self.vision_calls_saved = 0
 
         logger.info(f"Initialized GPT4VisionService with model: {default_model}")
 
+    async def aclose(self) -> None:
+        """Close the OpenAI client and its HTTP connections."""
+        await self.client.close()
+        logger.debug("Closed GPT4VisionService HTTP client")
+
+    async def _create_completion(self, **kwargs):
+        """Create a chat completion, with at most max_concurrent_requests in flight."""
+        async with self._request_semaphore:
+            return await self.client.chat.completions.create(**kwargs)
+
+    def _cache_key(self, image_hash: str, task: str, model: Optional[str], quality_tier: str) -> str:
+        """Build the cache key of a predefined-task analysis."""
+        # A digest of the prompt, so results of an older prompt are not reused
+        prompt_digest = hashlib.sha256(self.PROMPTS[task].encode("utf-8")).hexdigest()[:12]
+        return (
+            f"{image_hash}:{task}:{prompt_digest}:{model or self.default_model}:{quality_tier}:"
+            f"{self.max_tokens}:{self.temperature}"
+        )
+
     async def analyze_image(
         self,
         image_data: bytes,
         task: Literal["comprehensive", "ocr", "description", "diagram_analysis", "search_optimized"] = "comprehensive",
         custom_prompt: Optional[str] = None,
         model: Optional[str] = None,
+        image_hash: Optional[str] = None,
+        base64_image: Optional[str] = None,
+        quality_tier: Literal["fast", "high"] = "high",
     ) -> Dict[str, str]:
         """
         Analyze an image using GPT-4o Vision.
 
+        Results of predefined tasks are cached by image content, task, model
+        and generation settings when the service has a cache.
+
         Args:
             image_data: Image data as bytes
             task: Predefined task type, or use custom_prompt
             custom_prompt: Custom prompt (overrides task)
             model: Model to use (overrides default)
+            image_hash: SHA-256 hex digest of image_data, if already computed
+            base64_image: Base64 encoding of image_data, if already computed
+            quality_tier: "fast" sends images up to LOW_DETAIL_MAX_SIDE at low detail
 
         Returns:
             Dictionary with analysis results
         """
+        cache_key = None
+        if self.cache and not custom_prompt:
+            image_hash = image_hash or await asyncio.to_thread(_hash_image, image_data)
+            cache_key = self._cache_key(image_hash, task, model, quality_tier)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                self.vision_calls_saved += 1
+                logger.debug(f"Vision cache hit for {task} analysis")
+                return cached
+
         try:
-            # Encode image to base64
-            base64_image = base64.b64encode(image_data).decode('utf-8')
+            # Encode image to base64, off the event loop as large images
+            # take a while to preprocess
+            if base64_image is None:
+                base64_image = await asyncio.to_thread(_encode_image, image_data)
 
             # Determine prompt
             prompt = custom_prompt if custom_prompt else self.PROMPTS.get(task, self.PROMPTS["comprehensive"])
@@ -108,45 +381,59 @@ Write in a natural, paragraph form suitable for semantic search."""
             # Determine model
             model_to_use = model if model else self.default_model
 
-            # Call GPT-4o Vision
-            response = await self.client.chat.completions.create(
+            # The comprehensive task answers with structured output
+            structured = task == "comprehensive" and not custom_prompt
+            extra_args = {"response_format": self.COMPREHENSIVE_RESPONSE_FORMAT} if structured else {}
+            if not custom_prompt:
+                # Route requests for the same task to the same prompt cache
+                extra_args["prompt_cache_key"] = f"vision-{task}"
+
+            # Call GPT-4o Vision; the prompt goes first, in a system message,
+            # so requests for the same task share a prefix for OpenAI's
+            # prompt cache
+            response = await self._create_completion(
                 model=model_to_use,
                 messages=[
+                    {
+                        "role": "system",
+                        "content": prompt
+                    },
                     {
                         "role": "user",
                         "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
                             {
                                 "type": "image_url",
                                 "image_url": {
                                     "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"  # high detail for better text extraction
+                                    # high detail for better text extraction, unless the image is small
+                                    "detail": _image_detail(image_data, quality_tier)
                                 }
                             }
                         ]
                     }
                 ],
                 max_tokens=self.max_tokens,
-                temperature=self.temperature
+                temperature=self.temperature,
+                **extra_args
             )
 
             result_text = response.choices[0].message.content
 
             # Parse comprehensive response
-            if task == "comprehensive" and not custom_prompt:
-                parsed = self._parse_comprehensive_response(result_text)
-                return parsed
-
-            # For other tasks, return raw response
-            return {
-                "task": task,
-                "result": result_text,
-                "model": model_to_use,
-                "tokens_used": response.usage.total_tokens if response.usage else 0
-            }
+            if structured:
+                result = json.loads(result_text)
+            else:
+                # For other tasks, return raw response
+                result = {
+                    "task": task,
+                    "result": result_text,
+                    "model": model_to_use,
+                    "tokens_used": response.usage.total_tokens if response.usage else 0
+                }
+
+            if cache_key:
+                await asyncio.to_thread(self.cache.set, cache_key, result)
+            return result
 
         except Exception as e:
             logger.error(f"Error analyzing image with GPT-4o Vision: {str(e)}")
@@ -156,56 +443,134 @@ Write in a natural, paragraph form suitable for semantic search."""
                 "result": ""
             }
 
-    def _parse_comprehensive_response(self, text: str) -> Dict[str, str]:
+    async def analyze_images_batch(
+        self,
+        images: List[bytes],
+        task: Literal["ocr", "description", "diagram_analysis", "search_optimized"] = "search_optimized",
+        model: Optional[str] = None,
+        quality_tier: Literal["fast", "high"] = "high",
+        image_hashes: Optional[List[str]] = None,
+    ) -> List[Dict[str, str]]:
         """
-        Parse comprehensive analysis response into structured format.
+        Analyze several images with one request per VISION_BATCH_SIZE images.
+
+        Cached results are reused. The remaining images of a batch are sent
+        together with a prompt asking for a JSON list of per-image results;
+        if a response does not match its images, they are analyzed one by one.
 
         Args:
-            text: Raw response text
+            images: Image data as bytes
+            task: Predefined task type (not "comprehensive")
+            model: Model to use (overrides default)
+            quality_tier: "fast" sends images up to LOW_DETAIL_MAX_SIDE at low detail
+            image_hashes: SHA-256 hex digests of images, if already computed
 
         Returns:
-            Parsed response dictionary
+            One result per image, in order, shaped like analyze_image's
         """
-        result = {
-            "description": "",
-            "text_content": "",
-            "key_elements": "",
-            "context": ""
-        }
+        model_to_use = model if model else self.default_model
+        results: List[Optional[Dict[str, str]]] = [None] * len(images)
+
+        if self.cache:
+            if image_hashes is None:
+                image_hashes = await _hash_images(images)
+            cache_keys = [self._cache_key(image_hash, task, model, quality_tier) for image_hash in image_hashes]
+            cached = await asyncio.to_thread(self.cache.get_many, cache_keys)
+            results = [cached.get(cache_key) for cache_key in cache_keys]
+        else:
+            image_hashes = [None] * len(images)
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        self.vision_calls_saved += len(images) - len(pending)
+        batches = [pending[start:start + VISION_BATCH_SIZE] for start in range(0, len(pending), VISION_BATCH_SIZE)]
+
+        async def analyze_batch(batch: List[int]) -> None:
+            batch_results = None
+            if len(batch) > 1:
+                batch_results = await self._request_batch(
+                    [images[i] for i in batch], task, model_to_use, quality_tier
+                )
+            if batch_results is None:
+                # analyze_image caches its own results
+                batch_results = await asyncio.gather(
+                    *(self.analyze_image(
+                        images[i], task=task, model=model, image_hash=image_hashes[i], quality_tier=quality_tier
+                    ) for i in batch)
+                )
+            elif self.cache:
+                await asyncio.to_thread(self.cache.set_many, [
+                    (self._cache_key(image_hashes[i], task, model, quality_tier), result)
+                    for i, result in zip(batch, batch_results)
+                ])
+            for i, result in zip(batch, batch_results):
+                results[i] = result
+
+        await asyncio.gather(*(analyze_batch(batch) for batch in batches))
+        return results
+
+    async def _request_batch(
+        self,
+        images: List[bytes],
+        task: str,
+        model: str,
+        quality_tier: str
+    ) -> Optional[List[Dict[str, str]]]:
+        """
+        Analyze several images in a single chat completion.
 
-        # Simple parsing by looking for section headers
-        sections = {
-            "Description:": "description",
-            "Text Content:": "text_content",
-            "Key Elements:": "key_elements",
-            "Context:": "context"
-        }
+        Args:
+            images: Image data as bytes
+            task: Predefined task type
+            model: Model to use
+            quality_tier: "fast" sends images up to LOW_DETAIL_MAX_SIDE at low detail
 
-        current_section = None
-        lines = text.split('\n')
-
-        for line in lines:
-            line = line.strip()
-
-            # Check if this line starts a new section
-            section_found = False
-            for header, key in sections.items():
-                if line.startswith(header):
-                    current_section = key
-                    # Extract content after header
-                    content = line[len(header):].strip()
-                    result[key] = content
-                    section_found = True
-                    break
+        Returns:
+            One result per image, or None if the request failed or its
+            response could not be matched to the images
+        """
+        instructions = (
+            f"You are given {len(images)} images. Follow the system instructions for each image "
+            f'separately and respond with a JSON object {{"results": [...]}} holding exactly '
+            f"{len(images)} strings, one per image, in the order the images are given."
+        )
+        base64_images = await asyncio.gather(
+            *(asyncio.to_thread(_encode_image, image_data) for image_data in images)
+        )
+        content = [{"type": "text", "text": instructions}]
+        for image_data, base64_image in zip(images, base64_images):
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_image}",
+                    "detail": _image_detail(image_data, quality_tier)
+                }
+            })
+
+        try:
+            response = await self._create_completion(
+                model=model,
+                messages=[
+                    {"role": "system", "content": self.PROMPTS[task]},
+                    {"role": "user", "content": content}
+                ],
+                max_tokens=self.max_tokens * len(images),
+                temperature=self.temperature,
+                prompt_cache_key=f"vision-{task}",
+                response_format={"type": "json_object"}
+            )
+            texts = json.loads(response.choices[0].message.content)["results"]
+            if len(texts) != len(images) or not all(isinstance(text, str) for text in texts):
+                raise ValueError(f"expected {len(images)} results, got {len(texts)}")
 
-            # If not a header and we have a current section, append to it
-            if not section_found and current_section and line:
-                if result[current_section]:
-                    result[current_section] += " " + line
-                else:
-                    result[current_section] = line
+        except Exception as e:
+            logger.warning(f"Batched {task} analysis of {len(images)} images failed, analyzing one by one: {str(e)}")
+            return None
 
-        return result
+        tokens_used = response.usage.total_tokens // len(images) if response.usage else 0
+        return [
+            {"task": task, "result": text, "model": model, "tokens_used": tokens_used}
+            for text in texts
+        ]
 
     async def create_image_context_for_indexing(
         self,
@@ -217,7 +582,8 @@ Write in a natural, paragraph form suitable for semantic search."""
         Create rich context string for an image suitable for embedding and indexing.
 
         This method generates a comprehensive, search-optimized description
-        that can be embedded alongside text content.
+        that can be embedded alongside text content, using INDEXING_VISION_MODEL
+        at the "fast" quality tier.
 
         Args:
             image_data: Image data as bytes
@@ -228,81 +594,172 @@ Write in a natural, paragraph form suitable for semantic search."""
             Formatted context string ready for embedding
         """
         try:
-            # Get comprehensive analysis
-            analysis = await self.analyze_image(image_data, task="search_optimized")
+            # Get comprehensive analysis and text content; the two calls are
+            # independent, so they run concurrently (hashing and encoding the image once)
+            base64_image, image_hash = await asyncio.to_thread(_encode_and_hash, image_data)
+            analysis, ocr_result = await asyncio.gather(
+                self.analyze_image(
+                    image_data, task="search_optimized", model=INDEXING_VISION_MODEL,
+                    image_hash=image_hash, base64_image=base64_image, quality_tier="fast"
+                ),
+                self.analyze_image(
+                    image_data, task="ocr", model=INDEXING_VISION_MODEL,
+                    image_hash=image_hash, base64_image=base64_image, quality_tier="fast"
+                )
+            )
 
-            if "error" in analysis:
-                return f"[Image {image_index + 1}]: Error analyzing image - {analysis['error']}"
+            return self._format_image_context(image_index, document_context, analysis, ocr_result)
 
-            # Build context string
-            context_parts = [f"[Image {image_index + 1}]"]
+        except Exception as e:
+            logger.error(f"Error creating image context: {str(e)}")
+            return f"[Image {image_index + 1}]: Unable to analyze"
 
-            if document_context:
-                context_parts.append(f"Document Context: {document_context}")
+    async def create_image_contexts_for_indexing(
+        self,
+        images: List[bytes],
+        image_indices: List[int],
+        document_contexts: Optional[List[Optional[str]]] = None
+    ) -> List[str]:
+        """
+        Create indexing context strings for several images, batching the vision calls.
 
-            # Add the search-optimized description
-            context_parts.append(analysis.get("result", ""))
+        Like create_image_context_for_indexing, this uses INDEXING_VISION_MODEL
+        at the "fast" quality tier.
 
-            # Try to also get text content specifically
-            ocr_result = await self.analyze_image(image_data, task="ocr")
-            if ocr_result.get("result") and ocr_result["result"] != "No text detected":
-                context_parts.append(f"Text in image: {ocr_result['result']}")
+        Args:
+            images: Image data as bytes
+            image_indices: Index of each image in its document
+            document_contexts: Optional context about each image's document
 
-            return "\n".join(context_parts)
+        Returns:
+            One formatted context string per image, in order
+        """
+        if document_contexts is None:
+            document_contexts = [None] * len(images)
+        try:
+            # Hash once for both analyses' cache lookups
+            image_hashes = await _hash_images(images) if self.cache else None
+            analyses, ocr_results = await asyncio.gather(
+                self.analyze_images_batch(
+                    images, task="search_optimized", model=INDEXING_VISION_MODEL, quality_tier="fast",
+                    image_hashes=image_hashes
+                ),
+                self.analyze_images_batch(
+                    images, task="ocr", model=INDEXING_VISION_MODEL, quality_tier="fast",
+                    image_hashes=image_hashes
+                )
+            )
+            return [
+                self._format_image_context(image_index, document_context, analysis, ocr_result)
+                for image_index, document_context, analysis, ocr_result
+                in zip(image_indices, document_contexts, analyses, ocr_results)
+            ]
 
         except Exception as e:
-            logger.error(f"Error creating image context: {str(e)}")
-            return f"[Image {image_index + 1}]: Unable to analyze"
+            logger.error(f"Error creating image contexts: {str(e)}")
+            return [f"[Image {image_index + 1}]: Unable to analyze" for image_index in image_indices]
 
-    async def answer_question_about_images(
+    def _format_image_context(
+        self,
+        image_index: int,
+        document_context: Optional[str],
+        analysis: Dict[str, str],
+        ocr_result: Dict[str, str]
+    ) -> str:
+        """Build an image's indexing context from its search and OCR analyses."""
+        if "error" in analysis:
+            return f"[Image {image_index + 1}]: Error analyzing image - {analysis['error']}"
+
+        # Build context string
+        context_parts = [f"[Image {image_index + 1}]"]
+
+        if document_context:
+            context_parts.append(f"Document Context: {document_context}")
+
+        # Add the search-optimized description
+        context_parts.append(analysis.get("result", ""))
+
+        # Add text content specifically
+        if ocr_result.get("result") and ocr_result["result"] != "No text detected":
+            context_parts.append(f"Text in image: {ocr_result['result']}")
+
+        return "\n".join(context_parts)
+
+    async def stream_answer_about_images(
         self,
         question: str,
         images: List[bytes],
         context: Optional[str] = None,
-        model: Optional[str] = None
-    ) -> str:
+        model: Optional[str] = None,
+        scores: Optional[List[float]] = None
+    ) -> AsyncIterator[str]:
         """
-        Answer a question about one or more images.
-
-        This is useful for visual questions where the user wants to know
-        something specific about images retrieved from the vector store.
+        Stream the answer to a question about one or more images as it is generated.
 
         Args:
             question: User's question
             images: List of image data
             context: Optional text context from retrieved documents
             model: Model to use (defaults to gpt-4o for better quality)
+            scores: Optional retrieval score of each image; without scores,
+                images are taken to be in order of relevance
 
-        Returns:
-            Answer to the question
+        Yields:
+            Successive pieces of the answer
+
+        Raises:
+            Exception: If the request fails; pieces already yielded stand
         """
-        try:
-            # Use gpt-4o by default for question answering (better quality)
-            model_to_use = model if model else "gpt-4o"
-
-            # Build prompt
-            prompt = f"Question: {question}"
-            if context:
-                prompt = f"Context from documents:\n{context}\n\n{prompt}"
-
-            # Encode all images
-            image_contents = []
-            for image_data in images[:5]:  # Limit to 5 images for token efficiency
-                base64_image = base64.b64encode(image_data).decode('utf-8')
+        # Use gpt-4o by default for question answering (better quality)
+        model_to_use = model if model else "gpt-4o"
+
+        # Build prompt
+        prompt = f"Question: {question}"
+        if context:
+            prompt = f"Context from documents:\n{context}\n\n{prompt}"
+
+        # Encode the most relevant images that fit the token budget
+        if scores is not None:
+            ranked = sorted(zip(images, scores), key=lambda item: item[1], reverse=True)
+        else:
+            ranked = [(image, None) for image in images]
+        image_contents = []
+        tokens_used = 0
+        budget_reached = False
+        for start in range(0, len(ranked), PREPROCESS_BATCH_SIZE):
+            batch = ranked[start:start + PREPROCESS_BATCH_SIZE]
+            # Preprocessed a few at a time, so images past the budget never are
+            processed_images = await asyncio.gather(
+                *(asyncio.to_thread(_preprocess_image, image_data) for image_data, _ in batch)
+            )
+            for image_data, (_, score) in zip(processed_images, batch):
+                detail = "high" if score is None or score > HIGH_DETAIL_MIN_SCORE else "low"
+                tokens = _estimate_image_tokens(image_data, detail)
+                if detail == "high" and tokens_used + tokens > self.image_token_budget:
+                    detail, tokens = "low", LOW_DETAIL_IMAGE_TOKENS
+                if tokens_used + tokens > self.image_token_budget:
+                    budget_reached = True
+                    break
+                tokens_used += tokens
                 image_contents.append({
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}",
-                        "detail": "high"
+                        "url": f"data:image/jpeg;base64,{_b64encode(image_data)}",
+                        "detail": detail
                     }
                 })
-
-            # Build message content (text + images)
-            message_content = [{"type": "text", "text": prompt}]
-            message_content.extend(image_contents)
-
-            # Call GPT-4o Vision
-            response = await self.client.chat.completions.create(
+            if budget_reached:
+                break
+
+        # Build message content (text + images)
+        message_content = [{"type": "text", "text": prompt}]
+        message_content.extend(image_contents)
+
+        # Call GPT-4o Vision
+        # The request holds its concurrency slot until the stream is consumed;
+        # closing the generator early closes the stream and frees the slot
+        async with self._request_semaphore:
+            stream = await self.client.chat.completions.create(
                 model=model_to_use,
                 messages=[
                     {
@@ -311,13 +768,50 @@ Write in a natural, paragraph form suitable for semantic search."""
                     }
                 ],
                 max_tokens=self.max_tokens,
-                temperature=self.temperature
+                temperature=self.temperature,
+                stream=True
             )
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+        logger.info(
+            f"Answered question about {len(image_contents)} of {len(images)} images "
+            f"(~{tokens_used} image tokens) using {model_to_use}"
+        )
+
+    async def answer_question_about_images(
+        self,
+        question: str,
+        images: List[bytes],
+        context: Optional[str] = None,
+        model: Optional[str] = None,
+        scores: Optional[List[float]] = None
+    ) -> str:
+        """
+        Answer a question about one or more images.
 
-            answer = response.choices[0].message.content
-            logger.info(f"Answered question about {len(images)} images using {model_to_use}")
+        This is useful for visual questions where the user wants to know
+        something specific about images retrieved from the vector store.
+        The answer is collected from stream_answer_about_images.
+
+        Args:
+            question: User's question
+            images: List of image data
+            context: Optional text context from retrieved documents
+            model: Model to use (defaults to gpt-4o for better quality)
+            scores: Optional retrieval score of each image
 
-            return answer
+        Returns:
+            Answer to the question
+        """
+        try:
+            return "".join([
+                piece async for piece in self.stream_answer_about_images(
+                    question, images, context, model, scores
+                )
+            ])
 
         except Exception as e:
             logger.error(f"Error answering question about images: {str(e)}")
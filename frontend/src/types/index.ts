@@ -8,12 +8,15 @@ export interface RAGFusionConfig {
   enabled: boolean;
   num_queries: number;
   rrf_k: number;
+  top_k?: number | null;
 }
 
 export interface DecompositionConfig {
   enabled: boolean;
   mode: "recursive" | "individual";
   max_sub_questions: number;
+  qa_window: number;
+  context_char_budget: number;
 }
 
 export interface StepBackConfig {
@@ -101,8 +104,11 @@ export interface SyncResponse {
   documents_added: number;
   documents_updated: number;
   documents_skipped: number;
+  documents_failed?: number;
   chunks_created: number;
   message: string;
+  error_details?: string | null;
+  duration_seconds?: number | null;
 }
 
 // Conversation types for chat interface